@@ -0,0 +1,89 @@
+"""Benchmark the reference and the fused feature kernel per megapixel.
+
+Run from the repository root:
+
+    python bench/bench_feature_kernel.py
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Callable
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+from property_calculation import (  # noqa: E402
+    FeatureBuffers,
+    compute_feature_vector,
+    compute_feature_vector_fast,
+)
+
+
+def _time_kernel(
+    kernel: Callable[[np.ndarray], np.ndarray],
+    image: np.ndarray,
+    repeat: int,
+) -> float:
+    """Return the best wall time of kernel(image) over repeat runs."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        kernel(image)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    """Time both kernels on random images of growing size."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[128, 512, 1024, 2048],
+        help="side lengths of the square test images",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    buffers = FeatureBuffers()
+    results = []
+    for size in args.sizes:
+        image = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        megapixels = size * size / 1e6
+
+        # Both kernels must agree before their speed matters
+        np.testing.assert_allclose(
+            compute_feature_vector_fast(image, buffers),
+            compute_feature_vector(image),
+            rtol=1e-9,
+        )
+        reference = _time_kernel(compute_feature_vector, image, args.repeat)
+        fast = _time_kernel(
+            lambda image: compute_feature_vector_fast(image, buffers),
+            image,
+            args.repeat,
+        )
+        results.append(
+            {
+                "size": size,
+                "reference_ms_per_mp": reference * 1e3 / megapixels,
+                "fast_ms_per_mp": fast * 1e3 / megapixels,
+                "speedup": reference / fast,
+            }
+        )
+        print(
+            f"{size:>5}x{size:<5}  "
+            f"reference {results[-1]['reference_ms_per_mp']:8.2f} ms/MP  "
+            f"fast {results[-1]['fast_ms_per_mp']:8.2f} ms/MP  "
+            f"speedup x{results[-1]['speedup']:.2f}"
+        )
+    print(json.dumps({"results": results}))
+
+
+if __name__ == "__main__":
+    main()
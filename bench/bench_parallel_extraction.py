@@ -0,0 +1,83 @@
+"""Benchmark extract_image_features against the number of workers.
+
+Run from the repository root:
+
+    python bench/bench_parallel_extraction.py --count 2000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+from image_cache import default_cache  # noqa: E402
+from property_calculation import extract_image_features  # noqa: E402
+from synthetic import make_slice_folder  # noqa: E402
+
+
+def main() -> None:
+    """Time serial and parallel extraction on a synthetic folder."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--height", type=int, default=170)
+    parser.add_argument("--width", type=int, default=226)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="largest pool size to time (default: all cores)",
+    )
+    args = parser.parse_args()
+
+    # Powers of two up to the largest pool size, plus the size itself
+    worker_counts = sorted(
+        {1, args.max_workers}
+        | {2**i for i in range(1, 8) if 2**i < args.max_workers}
+    )
+
+    with tempfile.TemporaryDirectory() as folder_path:
+        make_slice_folder(
+            folder_path, args.count, size=(args.height, args.width)
+        )
+        reference = extract_image_features(folder_path)
+
+        results = []
+        for workers in worker_counts:
+            timings = []
+            for _ in range(args.repeat):
+                # Pool workers run without the decode cache, the serial
+                # run must decode every image too
+                default_cache.clear()
+                start = time.perf_counter()
+                feature_dict = extract_image_features(
+                    folder_path, workers=workers
+                )
+                timings.append(time.perf_counter() - start)
+            # The parallel path must reproduce the serial output exactly
+            assert list(feature_dict) == list(reference)
+            assert np.array_equal(
+                np.array(list(feature_dict.values())),
+                np.array(list(reference.values())),
+                equal_nan=True,
+            )
+            results.append({"workers": workers, "seconds": min(timings)})
+
+    serial = results[0]["seconds"]
+    for result in results:
+        result["speedup"] = serial / result["seconds"]
+        print(
+            f"workers={result['workers']:>3}  "
+            f"{result['seconds']:8.3f} s  "
+            f"speedup x{result['speedup']:.2f}"
+        )
+    print(json.dumps({"count": args.count, "results": results}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Benchmark compute_similarity by precision and output layout.
+
+The former implementation, a float64 dot product divided in place by
+both norms, is the reference every variant is checked against.
+
+Run from the repository root:
+
+    python bench/bench_similarity.py
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from functools import partial
+from typing import Any, Callable
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+from feature_table import FeatureTable  # noqa: E402
+from property_calculation import compute_similarity  # noqa: E402
+
+# Largest absolute difference to the reference allowed per precision
+TOLERANCE = {"float64": 1e-12, "float32": 1e-5}
+
+
+def _reference(feature_vectors: np.ndarray) -> np.ndarray:
+    """Return the similarity the way compute_similarity used to."""
+    similarity_matrix = np.dot(feature_vectors, feature_vectors.T)
+    norm = np.linalg.norm(feature_vectors, axis=1)
+    similarity_matrix /= norm[:, np.newaxis]
+    similarity_matrix /= norm[np.newaxis, :]
+    return similarity_matrix
+
+
+def _best_time(func: Callable[[], Any], repeat: int) -> float:
+    """Return the best wall time of func() over repeat runs."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    """Time the reference and every variant on random features."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--counts",
+        type=int,
+        nargs="+",
+        default=[1000, 4000, 10000],
+        help="numbers of feature vectors",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = []
+    for n in args.counts:
+        feature_vectors = rng.normal(size=(n, 14))
+        feature_table = FeatureTable(
+            [str(i) for i in range(n)], feature_vectors
+        )
+        reference = _reference(feature_vectors)
+        upper = np.triu_indices(n, k=1)
+        reference_time = _best_time(
+            partial(_reference, feature_vectors), args.repeat
+        )
+        print(f"N={n:<6} reference  {reference_time * 1e3:9.1f} ms")
+
+        for precision in ["float64", "float32"]:
+            for condensed in [False, True]:
+                result = compute_similarity(
+                    feature_table, dtype=precision, condensed=condensed
+                )
+                # Every variant must agree before its speed matters
+                expected = reference[upper] if condensed else reference
+                error = float(np.max(np.abs(result - expected)))
+                assert error <= TOLERANCE[precision], (precision, error)
+
+                seconds = _best_time(
+                    partial(
+                        compute_similarity,
+                        feature_table,
+                        dtype=precision,
+                        condensed=condensed,
+                    ),
+                    args.repeat,
+                )
+                results.append(
+                    {
+                        "count": n,
+                        "dtype": precision,
+                        "condensed": condensed,
+                        "ms": seconds * 1e3,
+                        "speedup": reference_time / seconds,
+                        "result_bytes": result.nbytes,
+                        "max_abs_error": error,
+                    }
+                )
+                layout = "condensed" if condensed else "full"
+                print(
+                    f"N={n:<6} {precision} {layout:<9} "
+                    f"{seconds * 1e3:9.1f} ms  "
+                    f"x{results[-1]['speedup']:.2f}  "
+                    f"{result.nbytes / 2**20:8.1f} MiB  "
+                    f"error {error:.1e}"
+                )
+    print(json.dumps({"results": results}))
+
+
+if __name__ == "__main__":
+    main()
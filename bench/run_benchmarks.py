@@ -0,0 +1,243 @@
+"""Benchmark suite for the property_calculation pipeline.
+
+Generates synthetic slice folders, times extract_image_features,
+compute_similarity and plot_heatmap separately and records the peak
+memory of every stage. Results are written as JSON so runs on different
+commits can be compared. Run from the repository root:
+
+    python bench/run_benchmarks.py --counts 10 100 1000 --output base.json
+    python bench/run_benchmarks.py --counts 10 100 1000 --compare base.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import cv2  # noqa: E402
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+from image_cache import default_cache  # noqa: E402
+from property_calculation import (  # noqa: E402
+    compute_similarity,
+    extract_image_features,
+    plot_heatmap,
+)
+from synthetic import make_slice_folder  # noqa: E402
+
+
+def _measure(func: Callable[[], Any], repeat: int) -> Tuple[Any, float, int]:
+    """Run func and return its result, best wall time and peak memory.
+
+    The timed runs and the traced run are separate, so tracemalloc does
+    not slow down the timings. The shared decode cache is cleared before
+    every run, otherwise repeats would time cache hits instead of decodes.
+    """
+    timings = []
+    for _ in range(repeat):
+        default_cache.clear()
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+        plt.close("all")
+
+    default_cache.clear()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        plt.close("all")
+        default_cache.clear()
+    return result, min(timings), peak_bytes
+
+
+def _git_commit() -> Optional[str]:
+    """Return the commit of the working tree, if it is a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run every benchmark case and return the JSON report."""
+    results: List[Dict[str, Any]] = []
+    for size in args.sizes:
+        for count in args.counts:
+            case = {"count": count, "size": size}
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                folder_path = os.path.join(tmp_dir, "slices")
+                make_slice_folder(folder_path, count, size=(size, size))
+
+                feature_dict, seconds, peak_bytes = _measure(
+                    partial(
+                        extract_image_features,
+                        folder_path,
+                        workers=args.workers,
+                    ),
+                    args.repeat,
+                )
+                results.append(
+                    {
+                        **case,
+                        "stage": "extract_image_features",
+                        "seconds": seconds,
+                        "peak_bytes": peak_bytes,
+                    }
+                )
+
+                if count > args.max_similarity_n:
+                    results.append(
+                        {
+                            **case,
+                            "stage": "compute_similarity",
+                            "skipped": True,
+                        }
+                    )
+                    continue
+                similarity_matrix, seconds, peak_bytes = _measure(
+                    partial(compute_similarity, feature_dict),
+                    args.repeat,
+                )
+                results.append(
+                    {
+                        **case,
+                        "stage": "compute_similarity",
+                        "seconds": seconds,
+                        "peak_bytes": peak_bytes,
+                    }
+                )
+
+                if count > args.max_heatmap_n:
+                    results.append(
+                        {**case, "stage": "plot_heatmap", "skipped": True}
+                    )
+                    continue
+                _, seconds, peak_bytes = _measure(
+                    partial(
+                        plot_heatmap,
+                        similarity_matrix,
+                        list(feature_dict),
+                        tmp_dir,
+                    ),
+                    args.repeat,
+                )
+                results.append(
+                    {
+                        **case,
+                        "stage": "plot_heatmap",
+                        "seconds": seconds,
+                        "peak_bytes": peak_bytes,
+                    }
+                )
+
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "workers": args.workers,
+        "results": results,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print the time and memory ratio of every case against a baseline."""
+    old = {
+        (r["count"], r["size"], r["stage"]): r
+        for r in baseline["results"]
+        if "seconds" in r
+    }
+    print(f"baseline commit {baseline.get('commit')}")
+    for r in report["results"]:
+        base = old.get((r["count"], r["size"], r["stage"]))
+        if base is None or "seconds" not in r:
+            continue
+        print(
+            f"{r['stage']:<24} n={r['count']:<7} {r['size']:>4}px  "
+            f"time x{r['seconds'] / base['seconds']:.2f}  "
+            f"memory x{r['peak_bytes'] / max(base['peak_bytes'], 1):.2f}"
+        )
+
+
+def main() -> None:
+    """Parse arguments, run the suite and write the report."""
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="\n".join(__doc__.splitlines()[1:]),
+    )
+    parser.add_argument(
+        "--counts",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000],
+        help="numbers of slices per folder, e.g. 10 1000 100000",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[64, 256],
+        help="side lengths of the square slices",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="workers passed to extract_image_features",
+    )
+    parser.add_argument(
+        "--max-similarity-n",
+        type=int,
+        default=20000,
+        help="skip compute_similarity above this count (N x N float64)",
+    )
+    parser.add_argument(
+        "--max-heatmap-n",
+        type=int,
+        default=20000,
+        help="skip plot_heatmap above this count",
+    )
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="JSON report to compare against")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Generate synthetic slice folders for the benchmarks."""
+
+import os
+from typing import Tuple
+
+import cv2
+import numpy as np
+
+
+def make_slice_folder(
+    folder_path: str,
+    count: int,
+    size: Tuple[int, int] = (170, 226),
+    seed: int = 0,
+) -> str:
+    """Write count random bbox_N.png crops into folder_path.
+
+    Args:
+    folder_path (str): Folder to create and fill.
+    count (int): Number of images to write.
+    size (tuple): (height, width) of every image.
+    seed (int): Seed for the random generator.
+
+    Returns:
+    folder_path (str): The filled folder.
+    """
+    os.makedirs(folder_path, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    height, width = size
+    for idx in range(count):
+        # Smooth background plus a few blobs so Canny finds real edges
+        image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        image = cv2.GaussianBlur(image, (7, 7), 0)
+        for _ in range(3):
+            center = (
+                int(rng.integers(0, width)),
+                int(rng.integers(0, height)),
+            )
+            radius = int(rng.integers(5, max(6, min(size) // 3)))
+            color = tuple(int(c) for c in rng.integers(0, 256, 3))
+            cv2.circle(image, center, radius, color, -1)
+        cv2.imwrite(os.path.join(folder_path, f"bbox_{idx + 1}.png"), image)
+    return folder_path
@@ -2,16 +2,32 @@
 
 import os
 import sys
-from typing import List, Optional, Tuple
+from bisect import bisect_left
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
-from PyQt5.QtCore import QPoint, QRect, Qt
+from PyQt5.QtCore import (
+    QPoint,
+    QPointF,
+    QRect,
+    QRectF,
+    QSize,
+    Qt,
+    QThreadPool,
+    pyqtSlot,
+)
 from PyQt5.QtGui import (
     QFont,
+    QFontMetrics,
+    QImage,
+    QImageReader,
     QMouseEvent,
     QPainter,
     QPaintEvent,
     QPen,
     QPixmap,
+    QResizeEvent,
+    QTransform,
+    QWheelEvent,
 )
 from PyQt5.QtWidgets import (
     QApplication,
@@ -22,9 +38,47 @@ from PyQt5.QtWidgets import (
     QWidget,
 )
 
+from annotations import BoxAnnotation, read_annotations, write_annotations
+from save_worker import SaveJob
+from spatial_index import Bounds, GridIndex
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from feature_table import FeatureTable
+    from profiling import PipelineStats
+    from tiled_image import ImagePyramid
+
+# Annotation file written next to the crops by save_images
+ANNOTATION_FILE = "annotations.csv"
+# Slice pack written by save_images(pack=True)
+PACK_FILE = "slices.slicepack"
+# Images with more pixels are shown tile by tile, see ImagePyramid
+TILED_IMAGE_PIXELS = 4096 * 4096
+# Largest zoom of a tiled image, in screen pixels per image pixel
+MAX_ZOOM = 8.0
+# Grid cells of the rectangle index along the longer view side
+INDEX_GRID_CELLS = 32
+# Widget pixels a box name may stick out of its rectangle when painting
+LABEL_MARGIN = 50
+
 
 class DrawableLabel(QLabel):
-    """A QLabel that allows users to draw and label rectangles on an image."""
+    """A QLabel that allows users to draw and label rectangles on an image.
+
+    Finished rectangles are painted once into a transparent overlay
+    pixmap, which paintEvent blits for the exposed region only. While a
+    rectangle is dragged, just the union of its previous and current
+    extent is repainted, so a frame costs the same with thousands of
+    boxes as with one.
+
+    Large images are shown from an ImagePyramid instead of a pixmap, see
+    set_pyramid. The wheel then zooms and a right button drag pans, and
+    the rectangles are kept in full resolution image pixels.
+
+    The rectangles are indexed in a GridIndex, so hit-testing, selection
+    and finding the boxes to paint do not scan the whole list.
+    """
 
     def __init__(self, parent: Optional[QWidget] = None) -> None:
         """Initialize the DrawableLabel with default attributes."""
@@ -33,60 +87,344 @@ class DrawableLabel(QLabel):
         self.end_point: QPoint = QPoint()
         self.drawing: bool = False
         self.current_rectangle: Tuple[QRect, str]
-        self.rectangles: List[Tuple[QRect, str]] = []
+        self.box_pen = QPen(Qt.red, 2, Qt.SolidLine)  # type: ignore # noqa
+        self.box_font = QFont("Arial", 10)
+        # Overlay of the finished rectangles and how many it contains
+        self._overlay: Optional[QPixmap] = None
+        self._overlay_count = 0
+        self._rectangles: List[Tuple[QRect, str]] = []
+        # Spatial index of the rectangles, keyed by stable ids so a
+        # removal does not renumber the later boxes. _ids holds the id of
+        # every indexed rectangle in list order, so it is increasing.
+        self._index: Optional[GridIndex] = None
+        self._ids: List[int] = []
+        self._next_id = 0
+        # Tiled view: screen pixels per image pixel and visible top left
+        self.pyramid: Optional[ImagePyramid] = None
+        self.zoom = 1.0
+        self.pan = QPointF(0, 0)
+        self._pan_anchor: Optional[QPoint] = None
+
+    @property
+    def rectangles(self) -> List[Tuple[QRect, str]]:
+        """Rectangles in view coordinates with their names.
+
+        View coordinates are label pixels, or image pixels for a tiled
+        image, see view_size. Appending is picked up by the next paint
+        and query. Use remove_rectangle to delete one, other in-place
+        changes must be followed by reassigning the list.
+        """
+        return self._rectangles
+
+    @rectangles.setter
+    def rectangles(self, rectangles: List[Tuple[QRect, str]]) -> None:
+        self._rectangles = rectangles
+        self._reindex()
+
+    def _reindex(self) -> None:
+        """Rebuild the index and the overlay after the rectangles changed."""
+        self._index = None
+        self.invalidate_overlay()
+
+    @staticmethod
+    def _bounds(rect: QRect) -> Bounds:
+        """Return the index bounds of a rectangle."""
+        rect = rect.normalized()
+        return (
+            rect.left(),
+            rect.top(),
+            rect.left() + rect.width(),
+            rect.top() + rect.height(),
+        )
+
+    def _sync_index(self) -> GridIndex:
+        """Index the appended rectangles, or rebuild after a change."""
+        if self._index is None or len(self._ids) > len(self.rectangles):
+            view_size = self.view_size()
+            longest = max(view_size.width(), view_size.height())
+            self._index = GridIndex(longest // INDEX_GRID_CELLS)
+            self._ids = []
+        for position in range(len(self._ids), len(self.rectangles)):
+            self._index.insert(
+                self._next_id, self._bounds(self.rectangles[position][0])
+            )
+            self._ids.append(self._next_id)
+            self._next_id += 1
+        return self._index
+
+    def _positions(self, item_ids: List[int]) -> List[int]:
+        """Map sorted index ids to list positions, keeping the order."""
+        return [bisect_left(self._ids, item_id) for item_id in item_ids]
+
+    def rectangle_at(self, point: QPoint) -> Optional[int]:
+        """Return the index of the topmost rectangle under a widget point."""
+        view_point = self.to_view(point)
+        hits = self._sync_index().query_point(view_point.x(), view_point.y())
+        return self._positions(hits)[-1] if hits else None
+
+    def rectangles_in(self, rect: QRect) -> List[int]:
+        """Return the indices of the rectangles intersecting a view area."""
+        return self._positions(
+            self._sync_index().query_rect(self._bounds(rect))
+        )
+
+    def remove_rectangle(self, position: int) -> None:
+        """Delete a rectangle, later ones move down by one index.
+
+        Only the index entry of the box is dropped and only the area it
+        was painted on is redrawn.
+        """
+        extent = self._box_extent(*self.rectangles[position])
+        del self.rectangles[position]
+        if self._index is not None and position < len(self._ids):
+            self._index.remove(self._ids.pop(position))
+        if self._overlay is not None and position < self._overlay_count:
+            self._overlay_count -= 1
+            self._repaint_overlay(extent)
+        self.update(extent)
+
+    def set_pyramid(self, pyramid: "ImagePyramid") -> None:
+        """Show a large image tile by tile instead of as a pixmap."""
+        self.pyramid = pyramid
+        self.setPixmap(QPixmap())
+        # The view coordinates changed, so does the grid cell size
+        self._reindex()
+        self.fit_view()
+
+    def fit_view(self) -> None:
+        """Zoom out to show the whole tiled image."""
+        if self.pyramid is not None:
+            self.zoom = self._min_zoom()
+            self.pan = QPointF(0, 0)
+        self.invalidate_overlay()
+
+    def _min_zoom(self) -> float:
+        """Zoom at which the tiled image fits the label."""
+        assert self.pyramid is not None
+        return min(
+            self.width() / self.pyramid.width,
+            self.height() / self.pyramid.height,
+        )
+
+    def image_size(self) -> QSize:
+        """Size of the displayed image in pixels."""
+        if self.pyramid is not None:
+            return QSize(self.pyramid.width, self.pyramid.height)
+        return self.pixmap().size()
+
+    def view_size(self) -> QSize:
+        """Size of the coordinate space the rectangles are stored in."""
+        if self.pyramid is not None:
+            return self.image_size()
+        return self.size()
+
+    def _transform(self) -> QTransform:
+        """Map view coordinates to widget coordinates."""
+        return (
+            QTransform()
+            .scale(self.zoom, self.zoom)
+            .translate(-self.pan.x(), -self.pan.y())
+        )
+
+    def to_screen(self, rect: QRect) -> QRect:
+        """Convert a rectangle from view to widget coordinates."""
+        if self.pyramid is None:
+            return rect
+        return self._transform().mapRect(rect)
+
+    def to_view(self, point: QPoint) -> QPoint:
+        """Convert a point from widget to view coordinates."""
+        if self.pyramid is None:
+            return point
+        return (QPointF(point) / self.zoom + self.pan).toPoint()
+
+    def invalidate_overlay(self) -> None:
+        """Repaint the finished rectangles from scratch on next paint."""
+        self._overlay = None
+        self.update()
+
+    def resizeEvent(self, event: QResizeEvent) -> None:
+        """Drop the overlay, it has the size of the widget."""
+        super().resizeEvent(event)
+        if self.pyramid is not None:
+            self.zoom = max(self.zoom, self._min_zoom())
+            self._clamp_pan()
+        self._overlay = None
+
+    def _clamp_pan(self) -> None:
+        """Keep the visible area inside the tiled image."""
+        assert self.pyramid is not None
+        max_x = max(self.pyramid.width - self.width() / self.zoom, 0.0)
+        max_y = max(self.pyramid.height - self.height() / self.zoom, 0.0)
+        self.pan = QPointF(
+            min(max(self.pan.x(), 0.0), max_x),
+            min(max(self.pan.y(), 0.0), max_y),
+        )
+
+    def zoom_at(self, point: QPoint, factor: float) -> None:
+        """Zoom a tiled image, keeping the image pixel under point fixed."""
+        if self.pyramid is None:
+            return
+        anchor = QPointF(point) / self.zoom + self.pan
+        self.zoom = min(max(self.zoom * factor, self._min_zoom()), MAX_ZOOM)
+        self.pan = anchor - QPointF(point) / self.zoom
+        self._clamp_pan()
+        self.invalidate_overlay()
+
+    def wheelEvent(self, event: QWheelEvent) -> None:
+        """Zoom a tiled image around the cursor."""
+        if self.pyramid is None:
+            super().wheelEvent(event)
+            return
+        # One wheel notch is 120 units
+        self.zoom_at(event.pos(), 1.25 ** (event.angleDelta().y() / 120))
+
+    def _box_extent(self, rect: QRect, name: str) -> QRect:
+        """Return the widget area painted for a box in view coordinates."""
+        rect = self.to_screen(rect.normalized())
+        text_rect = QFontMetrics(self.box_font).boundingRect(
+            rect,
+            Qt.AlignCenter,  # type: ignore # noqa
+            name,
+        )
+        pad = self.box_pen.width()
+        return rect.united(text_rect).adjusted(-pad, -pad, pad, pad)
+
+    def _rubber_band(self) -> Tuple[QRect, str]:
+        """Return the rectangle being drawn and its future name."""
+        return (
+            QRect(self.start_point, self.end_point),
+            f"item{len(self.rectangles) + 1}",
+        )
+
+    def _draw_box(self, painter: QPainter, rect: QRect, name: str) -> None:
+        """Draw a rectangle in view coordinates with its name inside."""
+        rect = self.to_screen(rect)
+        painter.drawRect(rect)
+        painter.drawText(rect, Qt.AlignCenter, name)  # type: ignore # noqa
+
+    def _view_rect_around(self, rect: QRect) -> QRect:
+        """Return the view area under a widget area, with a label margin.
+
+        Names can stick out of small boxes, so boxes within the margin
+        may paint into the area.
+        """
+        margin = rect.adjusted(
+            -LABEL_MARGIN, -LABEL_MARGIN, LABEL_MARGIN, LABEL_MARGIN
+        )
+        if self.pyramid is None:
+            return margin
+        return self._transform().inverted()[0].mapRect(margin)
+
+    def _visible_view_rect(self) -> QRect:
+        """Return the view area shown in the widget, with a label margin."""
+        return self._view_rect_around(self.rect())
+
+    def _repaint_overlay(self, area: QRect) -> None:
+        """Clear a widget area of the overlay and redraw the boxes in it."""
+        assert self._overlay is not None
+        painter = QPainter(self._overlay)
+        painter.setCompositionMode(QPainter.CompositionMode_Clear)
+        painter.fillRect(area, Qt.transparent)  # type: ignore # noqa
+        painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+        painter.setClipRect(area)
+        painter.setPen(self.box_pen)
+        painter.setFont(self.box_font)
+        for position in self.rectangles_in(self._view_rect_around(area)):
+            # Later boxes are painted incrementally by _update_overlay
+            if position < self._overlay_count:
+                self._draw_box(painter, *self.rectangles[position])
+        painter.end()
+
+    def _update_overlay(self) -> QPixmap:
+        """Paint the rectangles added since the last paint into the overlay."""
+        if self._overlay is None or self._overlay_count > len(self.rectangles):
+            self._overlay = QPixmap(self.size())
+            self._overlay.fill(Qt.transparent)  # type: ignore # noqa
+            # Only the rectangles in sight, they are a few of many when
+            # a tiled image is zoomed in
+            item_ids = self.rectangles_in(self._visible_view_rect())
+        else:
+            item_ids = list(range(self._overlay_count, len(self.rectangles)))
+        if item_ids:
+            painter = QPainter(self._overlay)
+            painter.setPen(self.box_pen)
+            painter.setFont(self.box_font)
+            for item_id in item_ids:
+                self._draw_box(painter, *self.rectangles[item_id])
+            painter.end()
+        self._overlay_count = len(self.rectangles)
+        return self._overlay
 
     def mousePressEvent(self, event: QMouseEvent) -> None:
         """Start drawing a rectangle on mouse press."""
         if event.button() == Qt.LeftButton:  # type: ignore # noqa
             self.drawing = True
-            self.start_point = event.pos()
+            self.start_point = self.to_view(event.pos())
             self.end_point = self.start_point
-            self.update()
+            self.update(self._box_extent(*self._rubber_band()))
+        elif (
+            event.button() == Qt.RightButton  # type: ignore # noqa
+            and self.pyramid is not None
+        ):
+            self._pan_anchor = event.pos()
 
     def mouseMoveEvent(self, event: QMouseEvent) -> None:
         """Update the rectangle dimensions on mouse move."""
         if event.buttons() & Qt.LeftButton and self.drawing:  # type: ignore # noqa
-            self.update()
+            old_extent = self._box_extent(*self._rubber_band())
+            self.end_point = self.to_view(event.pos())
+            # Only the area left by the old and covered by the new box
+            self.update(
+                old_extent.united(self._box_extent(*self._rubber_band()))
+            )
+        elif self._pan_anchor is not None and self.pyramid is not None:
+            self.pan -= QPointF(event.pos() - self._pan_anchor) / self.zoom
+            self._pan_anchor = event.pos()
+            self._clamp_pan()
+            self.invalidate_overlay()
 
     def mouseReleaseEvent(self, event: QMouseEvent) -> None:
         """Finish drawing the rectangle on mouse release."""
         if event.button() == Qt.LeftButton and self.drawing:  # type: ignore # noqa
+            old_extent = self._box_extent(*self._rubber_band())
             self.drawing = False
-            self.end_point = (
+            self.end_point = self.to_view(
                 event.pos()
             )  # Update end_point to current mouse position
-            self.rectangles.append(
-                (
-                    QRect(self.start_point, self.end_point),
-                    f"item{len(self.rectangles) + 1}",
-                )
+            self.rectangles.append(self._rubber_band())
+            self.update(
+                old_extent.united(self._box_extent(*self.rectangles[-1]))
             )
-            self.update()
+        elif event.button() == Qt.RightButton:  # type: ignore # noqa
+            self._pan_anchor = None
+
+    def _paint_tiles(self, painter: QPainter, exposed: QRect) -> None:
+        """Draw the pyramid tiles covering the exposed widget area."""
+        assert self.pyramid is not None
+        transform = self._transform()
+        visible = transform.inverted()[0].mapRect(exposed)
+        level = self.pyramid.level_for_scale(self.zoom)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        for source_rect, tile in self.pyramid.visible_tiles(level, visible):
+            painter.drawImage(transform.mapRect(QRectF(source_rect)), tile)
 
     def paintEvent(self, event: QPaintEvent) -> None:
-        """Draw the rectangles and labels on the widget."""
+        """Draw the image, rectangles and labels on the exposed region."""
         super().paintEvent(event)
+        overlay = self._update_overlay()
         painter = QPainter(self)
-        painter.setPen(QPen(Qt.red, 2, Qt.SolidLine))  # type: ignore # noqa
-        painter.setFont(QFont("Arial", 10))
-
-        # Draw existing rectangles
-        for rect, name in self.rectangles:
-            painter.drawRect(rect)
-            painter.drawText(rect, Qt.AlignCenter, name)  # type: ignore # noqa
+        exposed = event.rect()
+        if self.pyramid is not None:
+            self._paint_tiles(painter, exposed)
+        painter.drawPixmap(exposed, overlay, exposed)
 
         # Draw current rectangle being drawn
         if self.drawing:
-            self.current_rectangle = (
-                QRect(self.start_point, self.end_point),
-                f"item{len(self.rectangles) + 1}",
-            )
-            painter.drawRect(self.current_rectangle[0])
-            painter.drawText(
-                self.current_rectangle[0],
-                Qt.AlignCenter,  # type: ignore # noqa
-                self.current_rectangle[1],
-            )
+            painter.setPen(self.box_pen)
+            painter.setFont(self.box_font)
+            self.current_rectangle = self._rubber_band()
+            self._draw_box(painter, *self.current_rectangle)
 
 
 class MainWindow(QMainWindow):
@@ -96,6 +434,14 @@ class MainWindow(QMainWindow):
         """Set up the main window and initialize the UI."""
         super().__init__()
         self.test_mode = test_mode
+        self.output_directory = (
+            "tests/test_save" if test_mode else "slices_from_GUI"
+        )
+        # Crops are encoded on this pool, see save_images
+        self.save_pool = QThreadPool(self)
+        self.save_job: Optional[SaveJob] = None
+        # Set instead of self.image for large images, see show_pyramid
+        self.pyramid: Optional[ImagePyramid] = None
         self.initUI()
 
     def initUI(self) -> None:
@@ -110,17 +456,52 @@ class MainWindow(QMainWindow):
         # Add save button
         save_button = QPushButton("Save", self)
         save_button.setGeometry(10, 520, 100, 30)
-        save_button.clicked.connect(self.save_images)
+        save_button.clicked.connect(self.on_save_clicked)
+        self.cancel_button = QPushButton("Cancel save", self)
+        self.cancel_button.setGeometry(450, 520, 100, 30)
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_save)
+
+        # Add buttons to export and restore the boxes
+        export_button = QPushButton("Export boxes", self)
+        export_button.setGeometry(120, 520, 100, 30)
+        export_button.clicked.connect(lambda: self.export_annotations())
+        import_button = QPushButton("Import boxes", self)
+        import_button.setGeometry(230, 520, 100, 30)
+        import_button.clicked.connect(lambda: self.import_annotations())
+
+        # Add button to compare the boxes without writing crops
+        analyze_button = QPushButton("Analyze", self)
+        analyze_button.setGeometry(340, 520, 100, 30)
+        analyze_button.clicked.connect(self.on_analyze_clicked)
 
     def load_image(self) -> None:
         """Load an image file through a dialog and display it."""
+        self.image_path: Optional[str] = None
+        self.pyramid = None
         if not self.test_mode:
             file_name, _ = QFileDialog.getOpenFileName(
                 self, "Open Image", "", "Image files (*.jpg *.png)"
             )
             if file_name:
-                self.image = QPixmap(file_name)
-                self.image_label.setPixmap(self.image)
+                self.image_path = file_name
+                from image_cache import imread
+                from tiled_image import ImagePyramid, to_qimage
+
+                # Read the size from the header without decoding
+                size = QImageReader(file_name).size()
+                if size.width() * size.height() > TILED_IMAGE_PIXELS:
+                    self.show_pyramid(ImagePyramid.from_file(file_name))
+                else:
+                    # Decoded through the shared cache, reopening a study
+                    # skips the decode
+                    image = imread(file_name)
+                    self.image = (
+                        QPixmap.fromImage(to_qimage(image))
+                        if image is not None
+                        else QPixmap(file_name)
+                    )
+                    self.image_label.setPixmap(self.image)
             else:
                 self.close()
         else:
@@ -131,41 +512,312 @@ class MainWindow(QMainWindow):
             )  # Fill the pixmap with white or any other placeholder
             self.image_label.setPixmap(self.image)
 
-    def save_images(self) -> None:
-        """Save images of all bounding boxes."""
-        directory = "tests/test_save" if self.test_mode else "slices_from_GUI"
-        os.makedirs(directory, exist_ok=True)
-        if self.image:
-            pixmap_size = self.image_label.pixmap().size()
-            for idx, (rect, _) in enumerate(self.image_label.rectangles):
-                # Get coordinates of top left and bottom right points
-                top_left = rect.topLeft()
-                bottom_right = rect.bottomRight()
-                # Convert rect coordinates to match QPixmap coordinates
-                rect_translated = QRect(
-                    int(
-                        top_left.x()
-                        * pixmap_size.width()
-                        / self.image_label.width()
-                    ),
-                    int(
-                        top_left.y()
-                        * pixmap_size.height()
-                        / self.image_label.height()
-                    ),
-                    int(
-                        (bottom_right.x() - top_left.x())
-                        * pixmap_size.width()
-                        / self.image_label.width()
-                    ),
-                    int(
-                        (bottom_right.y() - top_left.y())
-                        * pixmap_size.height()
-                        / self.image_label.height()
-                    ),
+    def show_pyramid(self, pyramid: "ImagePyramid") -> None:
+        """Display a large image from its pyramid instead of a pixmap."""
+        self.pyramid = pyramid
+        # Keep the full resolution image out of pixmap memory
+        self.image = QPixmap()
+        self.image_label.setScaledContents(False)
+        self.image_label.set_pyramid(pyramid)
+
+    def label_to_image_rect(self, rect: QRect) -> QRect:
+        """Convert a rectangle from label to image pixel coordinates."""
+        rect = rect.normalized()
+        pixmap_size = self.image_label.image_size()
+        label_size = self.image_label.view_size()
+        # Get coordinates of top left and bottom right points
+        top_left = rect.topLeft()
+        bottom_right = rect.bottomRight()
+        # Convert rect coordinates to match QPixmap coordinates
+        return QRect(
+            int(top_left.x() * pixmap_size.width() / label_size.width()),
+            int(top_left.y() * pixmap_size.height() / label_size.height()),
+            int(
+                (bottom_right.x() - top_left.x())
+                * pixmap_size.width()
+                / label_size.width()
+            ),
+            int(
+                (bottom_right.y() - top_left.y())
+                * pixmap_size.height()
+                / label_size.height()
+            ),
+        )
+
+    def image_to_label_rect(self, rect: QRect) -> QRect:
+        """Convert a rectangle from image pixel to label coordinates.
+
+        This is the inverse of label_to_image_rect, up to rounding.
+        """
+        pixmap_size = self.image_label.image_size()
+        label_size = self.image_label.view_size()
+        scale_x = label_size.width() / pixmap_size.width()
+        scale_y = label_size.height() / pixmap_size.height()
+        top_left = QPoint(round(rect.x() * scale_x), round(rect.y() * scale_y))
+        return QRect(
+            top_left,
+            QPoint(
+                top_left.x() + round(rect.width() * scale_x),
+                top_left.y() + round(rect.height() * scale_y),
+            ),
+        )
+
+    def annotations(self) -> List[BoxAnnotation]:
+        """Return the rectangles as annotations in image pixels."""
+        image = os.path.abspath(self.image_path) if self.image_path else ""
+        annotations = []
+        for rect, name in self.image_label.rectangles:
+            image_rect = self.label_to_image_rect(rect)
+            annotations.append(
+                BoxAnnotation(
+                    image,
+                    name,
+                    image_rect.x(),
+                    image_rect.y(),
+                    image_rect.width(),
+                    image_rect.height(),
                 )
-                cropped = self.image.copy(rect_translated)
-                cropped.save(f"{directory}/bbox_{idx + 1}.png")
+            )
+        return annotations
+
+    def export_annotations(
+        self, path: Optional[str] = None, append: bool = False
+    ) -> None:
+        """Write the rectangles to an annotation file.
+
+        Args:
+        path (str, optional): CSV file to write, asked through a dialog
+        when omitted.
+        append (bool): Add the rectangles after the existing rows.
+        """
+        if path is None:
+            path, _ = QFileDialog.getSaveFileName(
+                self, "Export Boxes", "", "Annotation files (*.csv)"
+            )
+            if not path:
+                return
+        write_annotations(path, self.annotations(), append=append)
+
+    def import_annotations(self, path: Optional[str] = None) -> None:
+        """Restore the rectangles of the current image from a file.
+
+        Args:
+        path (str, optional): CSV file to read, asked through a dialog
+        when omitted. Rows of other images are ignored.
+        """
+        if path is None:
+            path, _ = QFileDialog.getOpenFileName(
+                self, "Import Boxes", "", "Annotation files (*.csv)"
+            )
+            if not path:
+                return
+        image = os.path.abspath(self.image_path) if self.image_path else None
+        self.image_label.rectangles = [
+            (
+                self.image_to_label_rect(
+                    QRect(
+                        annotation.x,
+                        annotation.y,
+                        annotation.width,
+                        annotation.height,
+                    )
+                ),
+                annotation.name,
+            )
+            for annotation in read_annotations(path)
+            if image is None or os.path.abspath(annotation.image) == image
+        ]
+        self.image_label.update()
+
+    def save_images(
+        self,
+        write_png: bool = True,
+        pack: bool = False,
+        stats: Optional["PipelineStats"] = None,
+    ) -> Optional[SaveJob]:
+        """Save images of all bounding boxes.
+
+        The crops are encoded and written in parallel on a background
+        thread pool, so the window stays responsive. Progress is shown in
+        the status bar and a running save can be stopped with
+        cancel_save. A save started while another one runs cancels it.
+
+        The box coordinates are written to annotations.csv next to the
+        crops, so they can be regenerated later with batch_crop.py.
+
+        Args:
+        write_png (bool): Whether to write the crops. Without them only
+        the annotation file is written, analyze_boxes computes the
+        features straight from the loaded image.
+        pack (bool): Also write the crops uncompressed into one slice
+        pack, slices.slicepack, which extract_feature_table reads with a
+        single memory map. The slices keep the bbox_N.png names.
+        stats (PipelineStats, optional): Receives the save stage once the
+        crops are written.
+
+        Returns:
+        save_job (SaveJob, optional): The started job, see wait_for_save.
+        """
+        directory = self.output_directory
+        os.makedirs(directory, exist_ok=True)
+        if not self.image and self.pyramid is None:
+            return None
+        self.export_annotations(
+            os.path.join(directory, ANNOTATION_FILE), append=False
+        )
+        if pack:
+            self.save_pack(os.path.join(directory, PACK_FILE))
+        if not write_png:
+            return None
+
+        self.cancel_save()
+        self.wait_for_save()
+        # QPixmap is bound to the GUI thread, the workers share a QImage
+        image = (
+            self.pyramid.qimage()
+            if self.pyramid is not None
+            else self.image.toImage()
+        )
+        crops = []
+        for idx, (rect, _) in enumerate(self.image_label.rectangles):
+            # Clip like batch_crop.crop, QImage.copy would pad with black,
+            # and skip boxes without pixels
+            image_rect = self.label_to_image_rect(rect).intersected(
+                image.rect()
+            )
+            if not image_rect.isEmpty():
+                crops.append((image_rect, f"{directory}/bbox_{idx + 1}.png"))
+        self.save_job = SaveJob(image, crops, self.save_pool, stats)
+        self.save_job.signals.progress.connect(self.on_save_progress)
+        self.save_job.signals.finished.connect(self.on_save_finished)
+        self.cancel_button.setEnabled(True)
+        self.save_job.start()
+        return self.save_job
+
+    def save_pack(self, path: str) -> int:
+        """Write the crops of all bounding boxes into a slice pack.
+
+        No PNG is encoded, the crops are copied from the loaded image, so
+        this runs on the GUI thread. Boxes outside the image are skipped.
+
+        Returns:
+        count (int): Number of packed crops.
+        """
+        from batch_crop import crop
+        from slice_pack import write_pack
+
+        image = self.image_array()
+        return write_pack(
+            path,
+            (
+                (f"bbox_{idx + 1}.png", cropped)
+                for idx, annotation in enumerate(self.annotations())
+                if (cropped := crop(image, annotation)).size
+            ),
+        )
+
+    def cancel_save(self) -> None:
+        """Stop the running save after the crops already started."""
+        if self.save_job is not None:
+            self.save_job.cancel()
+
+    def wait_for_save(self) -> None:
+        """Block until the running save is written and reported."""
+        if self.save_job is not None:
+            self.save_job.wait()
+            # Deliver the queued progress and finished signals
+            QApplication.processEvents()
+
+    @pyqtSlot()
+    def on_save_clicked(self) -> None:
+        """Start saving the boxes when the save button is clicked."""
+        self.save_images()
+
+    @pyqtSlot()
+    def on_analyze_clicked(self) -> None:
+        """Plot the similarity of the boxes when analyze is clicked."""
+        self.analyze_boxes(plot=True)
+
+    @pyqtSlot(int, int)
+    def on_save_progress(self, done: int, total: int) -> None:
+        """Show the number of written crops in the status bar."""
+        status_bar = self.statusBar()
+        assert status_bar is not None
+        status_bar.showMessage(f"Saving crops {done}/{total}")
+
+    @pyqtSlot(int, list)
+    def on_save_finished(self, written: int, failed: List[str]) -> None:
+        """Report the result of a save in the status bar."""
+        if self.save_job is not None and self.save_job.is_finished():
+            self.cancel_button.setEnabled(False)
+        if failed:
+            message = f"Saved {written} crops, failed: {', '.join(failed)}"
+        elif self.save_job is not None and self.save_job.cancelled:
+            message = f"Save cancelled after {written} crops"
+        else:
+            message = f"Saved {written} crops to {self.output_directory}"
+        status_bar = self.statusBar()
+        assert status_bar is not None
+        status_bar.showMessage(message)
+
+    def image_array(self) -> "np.ndarray":
+        """Return the loaded image as a BGR array like cv2.imread."""
+        import numpy as np
+
+        if self.pyramid is not None:
+            return self.pyramid.levels[0]
+        image = self.image.toImage().convertToFormat(
+            QImage.Format_RGB888  # type: ignore # noqa
+        )
+        height, width = image.height(), image.width()
+        bits = image.constBits()
+        assert bits is not None
+        # Read the pixels into bytes the array owns, so it does not depend
+        # on the lifetime of the QImage
+        pixels = bits.asstring(image.sizeInBytes())
+        # Rows are padded to bytesPerLine, drop the padding
+        rows = np.frombuffer(pixels, dtype=np.uint8).reshape(
+            height, image.bytesPerLine()
+        )
+        rgb = rows[:, : width * 3].reshape(height, width, 3)
+        return np.ascontiguousarray(rgb[:, :, ::-1])
+
+    def analyze_boxes(
+        self, plot: bool = False, integral: bool = False
+    ) -> "FeatureTable":
+        """Compute the features of all bounding boxes in memory.
+
+        The boxes are featurized on views of the loaded image, so no PNG
+        is written or read. The result equals extract_feature_table on
+        the folder written by save_images.
+
+        Args:
+        plot (bool): Also save the similarity heatmap of the boxes into
+        the output directory.
+        integral (bool): Featurize with summed-area tables, see
+        extract_box_features.
+
+        Returns:
+        feature_table (FeatureTable): Z-score normalized features, keyed
+        by the bbox_N.png names save_images would use.
+        """
+        from property_calculation import (
+            compute_similarity,
+            extract_box_features,
+            plot_heatmap,
+        )
+
+        feature_table = extract_box_features(
+            self.image_array(), self.annotations(), integral=integral
+        )
+        if plot and len(feature_table) > 1:
+            os.makedirs(self.output_directory, exist_ok=True)
+            plot_heatmap(
+                compute_similarity(feature_table),
+                feature_table.filenames,
+                self.output_directory,
+            )
+        return feature_table
 
 
 def main() -> None:
@@ -0,0 +1,94 @@
+"""Read and write bounding box annotation files.
+
+An annotation file is a CSV file with one bounding box per row:
+
+    image,name,x,y,width,height
+    /data/study_1.png,item1,10,12,50,40
+
+Coordinates are in image pixels, with (x, y) the top left corner, so a
+box covers columns x to x + width - 1 and rows y to y + height - 1 like
+QRect. Rows can be appended to an existing file without rewriting it.
+Relative image paths are resolved against the folder of the annotation
+file.
+"""
+
+import csv
+import os
+from typing import Dict, Iterable, List, NamedTuple
+
+FIELDS = ["image", "name", "x", "y", "width", "height"]
+
+
+class BoxAnnotation(NamedTuple):
+    """A named bounding box on an image, in image pixel coordinates."""
+
+    image: str
+    name: str
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+def write_annotations(
+    path: str, annotations: Iterable[BoxAnnotation], append: bool = True
+) -> None:
+    """Write bounding boxes to an annotation file.
+
+    Args:
+    path (str): CSV file to write.
+    annotations (iterable): Boxes to store.
+    append (bool): Add the boxes after the existing rows instead of
+    replacing the file. The header is only written to new files.
+    """
+    new_file = (
+        not append or not os.path.exists(path) or not os.path.getsize(path)
+    )
+    with open(path, "w" if new_file else "a", newline="") as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(FIELDS)
+        writer.writerows(annotations)
+
+
+def read_annotations(path: str) -> List[BoxAnnotation]:
+    """Read the bounding boxes of an annotation file.
+
+    Raises:
+    ValueError: If the header or a row is malformed.
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header != FIELDS:
+            raise ValueError(f"{path}: expected header {','.join(FIELDS)}")
+        annotations = []
+        for line_number, row in enumerate(reader, start=2):
+            if not row:
+                continue
+            try:
+                image, name, x, y, width, height = row
+                annotations.append(
+                    BoxAnnotation(
+                        os.path.join(folder, image),
+                        name,
+                        int(x),
+                        int(y),
+                        int(width),
+                        int(height),
+                    )
+                )
+            except ValueError as error:
+                raise ValueError(f"{path}:{line_number}: {error}") from None
+    return annotations
+
+
+def group_by_image(
+    annotations: Iterable[BoxAnnotation],
+) -> Dict[str, List[BoxAnnotation]]:
+    """Group boxes by image path, keeping their order."""
+    groups: Dict[str, List[BoxAnnotation]] = {}
+    for annotation in annotations:
+        groups.setdefault(annotation.image, []).append(annotation)
+    return groups
@@ -0,0 +1,146 @@
+"""Crop annotated bounding boxes from images without the GUI.
+
+Replays annotation files (see annotations.py) on a headless machine:
+
+    python src/batch_crop.py boxes.csv more_boxes.csv -o slices --workers 8
+
+The crops of every image are written to <output>/<image name>/bbox_N.png,
+numbered in annotation order like MainWindow.save_images does.
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from annotations import BoxAnnotation, group_by_image, read_annotations
+
+
+def crop(image: np.ndarray, annotation: BoxAnnotation) -> np.ndarray:
+    """Return the part of image covered by a box, as a view.
+
+    The box is clipped to the image like QPixmap.copy does, so the
+    result can be empty when the box lies outside the image.
+    """
+    height, width = image.shape[:2]
+    left = min(max(annotation.x, 0), width)
+    top = min(max(annotation.y, 0), height)
+    right = min(max(annotation.x + annotation.width, 0), width)
+    bottom = min(max(annotation.y + annotation.height, 0), height)
+    return image[top:bottom, left:right]
+
+
+def crop_image(
+    image_path: str, annotations: List[BoxAnnotation], output_dir: str
+) -> Tuple[int, List[str]]:
+    """Decode an image once and write the crops of all its boxes.
+
+    Returns:
+    (count, errors): Number of written crops and error messages.
+    """
+    import cv2
+
+    image = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return 0, [f"{image_path}: cannot read image"]
+
+    os.makedirs(output_dir, exist_ok=True)
+    count = 0
+    errors = []
+    for idx, annotation in enumerate(annotations):
+        cropped = crop(image, annotation)
+        if cropped.size == 0:
+            errors.append(
+                f"{image_path}: box {annotation.name} is outside the image"
+            )
+            continue
+        path = os.path.join(output_dir, f"bbox_{idx + 1}.png")
+        if not cv2.imwrite(path, cropped):
+            errors.append(
+                f"{image_path}: cannot write box {annotation.name} to {path}"
+            )
+            continue
+        count += 1
+    return count, errors
+
+
+def batch_crop(
+    annotation_paths: List[str],
+    output_dir: str,
+    workers: Optional[int] = None,
+) -> Tuple[int, List[str]]:
+    """Crop every annotated box, one image per task in a process pool.
+
+    Args:
+    annotation_paths (list): Annotation files to replay.
+    output_dir (str): Folder receiving one subfolder per image.
+    workers (int, optional): Number of processes, None uses every core
+    and 1 runs in the calling process.
+
+    Returns:
+    (count, errors): Number of written crops and error messages.
+    """
+    annotations = [
+        annotation
+        for path in annotation_paths
+        for annotation in read_annotations(path)
+    ]
+    groups = group_by_image(annotations)
+    image_paths = list(groups)
+    # Subfolder per image, named after the image without its extension
+    output_dirs = [
+        os.path.join(
+            output_dir, os.path.splitext(os.path.basename(image_path))[0]
+        )
+        for image_path in image_paths
+    ]
+    if len(set(output_dirs)) != len(output_dirs):
+        raise ValueError("Annotated images must have distinct file names")
+    jobs = [
+        (image_path, groups[image_path], folder)
+        for image_path, folder in zip(image_paths, output_dirs, strict=True)
+    ]
+
+    if workers == 1 or not jobs:
+        results = [crop_image(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(crop_image, *zip(*jobs, strict=True)))
+
+    count = sum(result[0] for result in results)
+    errors = [error for result in results for error in result[1]]
+    return count, errors
+
+
+def main() -> None:
+    """Run the batch cropper from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Crop annotated bounding boxes from images."
+    )
+    parser.add_argument(
+        "annotations", nargs="+", help="annotation CSV files to replay"
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="slices_from_GUI",
+        help="output folder (default: slices_from_GUI)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of processes (default: all cores)",
+    )
+    args = parser.parse_args()
+
+    count, errors = batch_crop(args.annotations, args.output, args.workers)
+    for error in errors:
+        print(f"warning: {error}")
+    print(f"{count} crops written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Persistent cache of raw image feature vectors."""
+
+import os
+import tempfile
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+
+class FeatureCache:
+    """On-disk cache of raw feature vectors stored in a NumPy .npz file.
+
+    Every entry is keyed on the image path and is only valid while the
+    file keeps the same mtime and size. The whole cache is dropped when
+    it was written with a different feature version.
+    """
+
+    def __init__(self, cache_path: str, version: str) -> None:
+        """Load the cache file if it exists and matches the version.
+
+        Args:
+        cache_path (str): Path of the .npz side file.
+        version (str): Tag of the feature definition the vectors use.
+        """
+        self.cache_path = cache_path
+        self.version = version
+        self.dirty = False
+        # path -> (mtime_ns, size, raw feature vector)
+        self._entries: Dict[str, Tuple[int, int, np.ndarray]] = {}
+        if os.path.exists(cache_path):
+            self._load()
+
+    def __len__(self) -> int:
+        """Return the number of cached vectors."""
+        return len(self._entries)
+
+    def _load(self) -> None:
+        """Read the entries from the side file."""
+        try:
+            with np.load(self.cache_path) as data:
+                if str(data["version"]) != self.version:
+                    self.dirty = True  # Rewrite with the new version
+                    return
+                paths = data["paths"]
+                mtimes = data["mtime_ns"]
+                sizes = data["size"]
+                features = data["features"]
+        except (OSError, ValueError, KeyError):
+            self.dirty = True  # Unreadable cache, start over
+            return
+        for i, path in enumerate(paths):
+            self._entries[str(path)] = (
+                int(mtimes[i]),
+                int(sizes[i]),
+                features[i],
+            )
+
+    def get(self, path: str, stat: os.stat_result) -> Optional[np.ndarray]:
+        """Return the cached vector of path, or None if missing or stale."""
+        entry = self._entries.get(path)
+        if entry is None:
+            return None
+        mtime_ns, size, feature_vector = entry
+        if mtime_ns != stat.st_mtime_ns or size != stat.st_size:
+            return None
+        return feature_vector
+
+    def put(
+        self, path: str, stat: os.stat_result, feature_vector: np.ndarray
+    ) -> None:
+        """Store the raw feature vector of path."""
+        self._entries[path] = (stat.st_mtime_ns, stat.st_size, feature_vector)
+        self.dirty = True
+
+    def evict_missing(self, paths: Iterable[str]) -> int:
+        """Drop every entry whose path is not in paths.
+
+        Returns:
+        count (int): Number of evicted entries.
+        """
+        keep = set(paths)
+        stale = [path for path in self._entries if path not in keep]
+        for path in stale:
+            del self._entries[path]
+        if stale:
+            self.dirty = True
+        return len(stale)
+
+    def save(self) -> None:
+        """Write the cache atomically if it changed since it was loaded."""
+        if not self.dirty:
+            return
+        paths = list(self._entries)
+        entries = [self._entries[path] for path in paths]
+        features = (
+            np.array([entry[2] for entry in entries], dtype=np.float64)
+            if entries
+            else np.empty((0, 0))
+        )
+        folder = os.path.dirname(os.path.abspath(self.cache_path))
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    version=np.array(self.version),
+                    paths=np.array(paths, dtype=str),
+                    mtime_ns=np.array(
+                        [entry[0] for entry in entries], dtype=np.int64
+                    ),
+                    size=np.array(
+                        [entry[1] for entry in entries], dtype=np.int64
+                    ),
+                    features=features,
+                )
+            os.replace(tmp_path, self.cache_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.dirty = False
@@ -0,0 +1,83 @@
+"""Compact array-backed storage for per-image feature vectors."""
+
+from typing import Dict, Iterator, List, Mapping, Sequence
+
+import numpy as np
+
+
+class FeatureTable(Mapping[str, List[float]]):
+    """Feature vectors stored as one contiguous (N, D) matrix.
+
+    Row i of matrix belongs to filenames[i]. The table is a read-only
+    mapping from filename to feature list, so it can be used wherever the
+    Dict[str, List[float]] returned by extract_image_features is
+    expected, but the lists are only built when a single entry is looked
+    up. Array consumers read matrix directly without any copy.
+    """
+
+    def __init__(self, filenames: Sequence[str], matrix: np.ndarray) -> None:
+        """Initialize the table.
+
+        Args:
+        filenames (sequence): Image names, one per row.
+        matrix (ndarray): (N, D) feature matrix. It is used as is when
+        already C-contiguous.
+
+        Raises:
+        ValueError: If the number of names and rows differ.
+        """
+        matrix = np.ascontiguousarray(matrix)
+        if matrix.ndim != 2 or len(filenames) != len(matrix):
+            raise ValueError(
+                f"Expected {len(filenames)} rows, got shape {matrix.shape}"
+            )
+        self.filenames: List[str] = list(filenames)
+        self.matrix = matrix
+        self._index: Dict[str, int] = {
+            filename: i for i, filename in enumerate(self.filenames)
+        }
+
+    @classmethod
+    def from_dict(
+        cls, feature_dict: Mapping[str, Sequence[float]]
+    ) -> "FeatureTable":
+        """Build a table from a filename to feature vector dictionary."""
+        if isinstance(feature_dict, FeatureTable):
+            return feature_dict
+        if not feature_dict:
+            # reshape cannot infer the width of zero rows
+            return cls([], np.empty((0, 0)))
+        return cls(
+            list(feature_dict),
+            np.array(list(feature_dict.values()), dtype=np.float64).reshape(
+                len(feature_dict), -1
+            ),
+        )
+
+    def __getitem__(self, filename: str) -> List[float]:
+        """Return the feature vector of an image as a list of floats."""
+        return self.matrix[self._index[filename]].tolist()
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the filenames in row order."""
+        return iter(self.filenames)
+
+    def __len__(self) -> int:
+        """Return the number of images."""
+        return len(self.filenames)
+
+    def __contains__(self, filename: object) -> bool:
+        """Return whether an image is in the table."""
+        return filename in self._index
+
+    def index(self, filename: str) -> int:
+        """Return the row of an image."""
+        return self._index[filename]
+
+    def row(self, filename: str) -> np.ndarray:
+        """Return the feature vector of an image as an array view."""
+        return self.matrix[self._index[filename]]
+
+    def to_dict(self) -> Dict[str, List[float]]:
+        """Return a plain dictionary of feature lists."""
+        return dict(zip(self.filenames, self.matrix.tolist(), strict=True))
@@ -0,0 +1,262 @@
+"""Keep the features and similarity of a slice folder up to date.
+
+A FolderWatcher polls a folder with os.scandir and featurizes only the
+images whose size or modification time changed. The Z-score statistics
+are tracked with an IncrementalNormalizer, and the similarity matrix is
+patched row by row and column by column, so a GUI save of a few boxes
+costs O(changed x N) instead of a full extraction and an O(N^2)
+similarity. Run it from the command line with:
+
+    python src/property_calculation.py slices_from_GUI --watch
+"""
+
+import fnmatch
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from feature_table import FeatureTable
+from normalization import IncrementalNormalizer
+from image_cache import ImageCache
+from property_calculation import read_feature_vector, scan_images
+
+# (mtime_ns, size) of a tracked file
+_FileStat = Tuple[int, int]
+
+
+class FolderWatcher:
+    """Incrementally maintained features and similarity of a folder.
+
+    Rows are normalized with statistics frozen at the last full refresh.
+    Once the running statistics drift further than drift_tolerance away
+    from them, in units of the frozen standard deviation, every row is
+    renormalized and the similarity recomputed. With drift_tolerance=0
+    the results always equal extract_feature_table and
+    compute_similarity on the folder, up to row order and rounding.
+    """
+
+    def __init__(
+        self,
+        folder_path: str,
+        pattern: Optional[str] = None,
+        drift_tolerance: float = 0.05,
+    ) -> None:
+        """Create a watcher, call poll to read the folder.
+
+        Args:
+        folder_path (str): Folder to watch.
+        pattern (str, optional): Glob the file names must match, e.g.
+        "bbox_*.png". Every image is watched by default, like
+        extract_image_features does.
+        drift_tolerance (float): Largest change of a feature mean or
+        standard deviation before a full refresh.
+        """
+        self.folder_path = folder_path
+        self.pattern = pattern
+        self.drift_tolerance = drift_tolerance
+        self.normalizer = IncrementalNormalizer()
+        self.filenames: List[str] = []
+        self._stats: Dict[str, _FileStat] = {}
+        self._rows: Dict[str, int] = {}
+        # Preallocated buffers, only the first len(self) rows are valid
+        self._vectors = np.empty((0, 0))
+        self._similarity = np.empty((0, 0))
+        self._mean = np.zeros(0)
+        self._std = np.zeros(0)
+        # Changed files are decoded once, keep them out of the shared
+        # image cache
+        self._cache = ImageCache(max_bytes=0)
+
+    def __len__(self) -> int:
+        """Return the number of tracked images."""
+        return len(self.filenames)
+
+    @property
+    def similarity(self) -> np.ndarray:
+        """(N, N) cosine similarity in the order of filenames, a view."""
+        n = len(self)
+        return self._similarity[:n, :n]
+
+    def feature_table(self) -> FeatureTable:
+        """Return the Z-score normalized features with the frozen stats."""
+        raw = np.array(
+            [self.normalizer[name] for name in self.filenames]
+        ).reshape(len(self), -1)
+        return FeatureTable(
+            list(self.filenames), (raw - self._mean) / self._std
+        )
+
+    def scan(self) -> Tuple[Dict[str, _FileStat], List[str]]:
+        """Compare the folder with the tracked files.
+
+        Returns:
+        (changed, removed): Stats of new or modified files and names of
+        deleted files.
+        """
+        current = {}
+        for entry in scan_images(self.folder_path):
+            if self.pattern and not fnmatch.fnmatch(entry.name, self.pattern):
+                continue
+            stat = entry.stat()
+            current[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        changed = {
+            name: stat
+            for name, stat in current.items()
+            if self._stats.get(name) != stat
+        }
+        removed = [name for name in self._stats if name not in current]
+        return changed, removed
+
+    def poll(self) -> bool:
+        """Featurize changed files and update the similarity matrix.
+
+        Files that cannot be decoded yet, e.g. while they are written,
+        are retried on the next poll.
+
+        Returns:
+        changed (bool): Whether the features changed.
+        """
+        changed, removed = self.scan()
+        for name in removed:
+            del self._stats[name]
+            self.normalizer.remove(name)
+            self._remove_row(name)
+
+        updated = []
+        for name, stat in changed.items():
+            raw_vector = read_feature_vector(
+                os.path.join(self.folder_path, name), cache=self._cache
+            )
+            if raw_vector is None:
+                continue
+            self._stats[name] = stat
+            self.normalizer.add(name, raw_vector)
+            updated.append(name)
+
+        if not updated and not removed:
+            return False
+        if self._drifted():
+            self.refresh()
+        else:
+            for name in updated:
+                self._update_row(name)
+        return True
+
+    def refresh(self) -> None:
+        """Freeze the current statistics and recompute every row."""
+        self.normalizer.recompute()
+        self._mean = self.normalizer.mean.copy()
+        self._std = self.normalizer.std
+        n = len(self.normalizer)
+        dim = len(self._mean)
+        self._vectors = np.empty((n, dim))
+        self._similarity = np.empty((n, n))
+        self.filenames = list(self.normalizer)
+        self._rows = {name: row for row, name in enumerate(self.filenames)}
+        if not n:
+            return
+        self._vectors[:] = self._unit_vectors(
+            np.array([self.normalizer[name] for name in self.filenames])
+        )
+        np.dot(self._vectors, self._vectors.T, out=self._similarity)
+
+    def _drifted(self) -> bool:
+        """Whether the running statistics left the frozen ones."""
+        if len(self._mean) != len(self.normalizer.mean) or not len(self):
+            return True
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean_shift = np.abs(self.normalizer.mean - self._mean) / self._std
+            std_change = np.abs(self.normalizer.std / self._std - 1)
+        # 0 / 0 for constant features that stayed constant
+        drift = np.nan_to_num(np.concatenate([mean_shift, std_change]))
+        return bool(np.max(drift) > self.drift_tolerance)
+
+    def _unit_vectors(self, raw_vectors: np.ndarray) -> np.ndarray:
+        """Z-score with the frozen statistics and L2-normalize rows."""
+        z_score_features = (raw_vectors - self._mean) / self._std
+        norm = np.linalg.norm(z_score_features, axis=-1, keepdims=True)
+        return np.asarray(z_score_features / norm)
+
+    def _reserve(self, n: int) -> None:
+        """Grow the buffers to hold at least n rows."""
+        capacity = len(self._vectors)
+        if n <= capacity:
+            return
+        capacity = max(n, 2 * capacity, 16)
+        old_n = len(self)
+        vectors = np.empty((capacity, len(self._mean)))
+        vectors[:old_n] = self._vectors[:old_n]
+        similarity = np.empty((capacity, capacity))
+        similarity[:old_n, :old_n] = self._similarity[:old_n, :old_n]
+        self._vectors = vectors
+        self._similarity = similarity
+
+    def _update_row(self, name: str) -> None:
+        """Renormalize one image and patch its row and column."""
+        row = self._rows.get(name)
+        if row is None:
+            row = len(self)
+            self._reserve(row + 1)
+            self._rows[name] = row
+            self.filenames.append(name)
+        n = len(self)
+        self._vectors[row] = self._unit_vectors(self.normalizer[name])
+        scores = self._vectors[:n] @ self._vectors[row]
+        self._similarity[row, :n] = scores
+        self._similarity[:n, row] = scores
+
+    def _remove_row(self, name: str) -> None:
+        """Drop one image by moving the last row into its place."""
+        row = self._rows.pop(name, None)
+        if row is None:
+            return
+        last = len(self) - 1
+        last_name = self.filenames.pop()
+        if row != last:
+            self.filenames[row] = last_name
+            self._rows[last_name] = row
+            self._vectors[row] = self._vectors[last]
+            self._similarity[row, :last] = self._similarity[last, :last]
+            self._similarity[:last, row] = self._similarity[:last, last]
+            self._similarity[row, row] = self._similarity[last, last]
+
+
+def watch(
+    folder_path: str,
+    on_update: Callable[[FolderWatcher], None],
+    pattern: Optional[str] = None,
+    interval: float = 0.2,
+    debounce: float = 0.3,
+    drift_tolerance: float = 0.05,
+) -> None:
+    """Poll a folder forever and call on_update after changes settle.
+
+    Features and similarity are updated on every poll, on_update only
+    runs once no change was seen for debounce seconds, so a burst of
+    saved crops triggers one refresh of the outputs.
+
+    Args:
+    folder_path (str): Folder to watch.
+    on_update (callable): Called with the watcher, e.g. to plot the
+    heatmap.
+    pattern (str, optional): See FolderWatcher.
+    interval (float): Seconds between two polls.
+    debounce (float): Quiet seconds before on_update runs.
+    drift_tolerance (float): See FolderWatcher.
+    """
+    watcher = FolderWatcher(folder_path, pattern, drift_tolerance)
+    last_change: Optional[float] = None
+    if watcher.poll():
+        last_change = 0.0
+    while True:
+        if watcher.poll():
+            last_change = time.monotonic()
+        if (
+            last_change is not None
+            and time.monotonic() - last_change >= debounce
+        ):
+            last_change = None
+            on_update(watcher)
+        time.sleep(interval)
@@ -0,0 +1,143 @@
+"""Shared LRU cache of decoded images.
+
+The GUI and the feature code decode the same files over and over when a
+user flips between studies or reruns an analysis. ImageCache keeps the
+decoded arrays under a byte budget and drops the least recently used
+ones first. Entries are keyed by path, decode flags, modification time
+and size, so a rewritten file is decoded again.
+
+Cached arrays are shared between callers and marked read-only, copy one
+before modifying it.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Default budget of the shared cache
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# (absolute path, imread flags, mtime_ns, size)
+_CacheKey = Tuple[str, int, int, int]
+
+
+class ImageCache:
+    """Least recently used cache of cv2.imread results under a byte budget.
+
+    Attributes:
+    hits (int): Reads served from the cache.
+    misses (int): Reads that decoded the file.
+    evictions (int): Entries dropped to stay under the budget.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        """Create an empty cache.
+
+        Args:
+        max_bytes (int): Largest total size of the cached arrays. Images
+        larger than the budget are decoded but not cached.
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._images: OrderedDict[_CacheKey, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of cached images."""
+        return len(self._images)
+
+    def imread(
+        self, image_path: str, flags: Optional[int] = None
+    ) -> Optional["np.ndarray"]:
+        """Decode an image like cv2.imread, reusing a cached result.
+
+        Args:
+        image_path (str): Image file.
+        flags (int, optional): cv2.IMREAD_* flags, cv2.IMREAD_COLOR by
+        default.
+
+        Returns:
+        image (ndarray, optional): Read-only decoded image, None if the
+        file cannot be read.
+        """
+        import cv2
+
+        if flags is None:
+            flags = cv2.IMREAD_COLOR
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return None
+        key = (
+            os.path.abspath(image_path),
+            flags,
+            stat.st_mtime_ns,
+            stat.st_size,
+        )
+
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return image
+            self.misses += 1
+
+        # Decode outside of the lock, other threads can hit meanwhile
+        image = cv2.imread(image_path, flags)
+        if image is None:
+            return None
+        image.setflags(write=False)
+        with self._lock:
+            if key not in self._images and image.nbytes <= self.max_bytes:
+                self._images[key] = image
+                self.current_bytes += image.nbytes
+                self._evict(self.max_bytes)
+        return image
+
+    def resize(self, max_bytes: int) -> None:
+        """Change the budget, evicting entries if it shrinks."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict(max_bytes)
+
+    def clear(self) -> None:
+        """Drop every entry, the counters are kept."""
+        with self._lock:
+            self._images.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return the counters and the memory use."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._images),
+            "bytes": self.current_bytes,
+        }
+
+    def _evict(self, max_bytes: int) -> None:
+        """Drop least recently used entries until under max_bytes."""
+        while self.current_bytes > max_bytes:
+            _, image = self._images.popitem(last=False)
+            self.current_bytes -= image.nbytes
+            self.evictions += 1
+
+
+# Cache shared by the GUI and the feature extraction of a process
+default_cache = ImageCache()
+
+
+def imread(
+    image_path: str, flags: Optional[int] = None
+) -> Optional["np.ndarray"]:
+    """Decode an image through the shared cache, see ImageCache.imread."""
+    return default_cache.imread(image_path, flags)
@@ -0,0 +1,144 @@
+"""Incremental Z-score normalization of feature vectors."""
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from feature_table import FeatureTable
+
+
+class IncrementalNormalizer:
+    """Z-score normalizer that keeps running statistics of raw vectors.
+
+    The mean and variance are updated with Welford's algorithm when a
+    vector is added and with its inverse when one is removed, so keeping
+    the statistics current costs O(changed images) instead of a rescan of
+    the whole folder. The variance is the population variance, matching
+    the np.std used by extract_image_features.
+    """
+
+    def __init__(
+        self, raw_features: Optional[Dict[str, np.ndarray]] = None
+    ) -> None:
+        """Initialize the normalizer, optionally with raw feature vectors.
+
+        Args:
+        raw_features (dict, optional): Image names mapped to raw feature
+        vectors, e.g. the output of extract_raw_features.
+        """
+        self._vectors: Dict[str, np.ndarray] = {}
+        self.count = 0
+        self.mean: np.ndarray = np.zeros(0)
+        self._m2: np.ndarray = np.zeros(0)
+        if raw_features:
+            self.update(raw_features.items())
+
+    def __len__(self) -> int:
+        """Return the number of tracked images."""
+        return self.count
+
+    def __contains__(self, name: object) -> bool:
+        """Return whether the image name is tracked."""
+        return name in self._vectors
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the tracked image names in insertion order."""
+        return iter(self._vectors)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Return the raw feature vector of an image."""
+        return self._vectors[name]
+
+    @property
+    def variance(self) -> np.ndarray:
+        """Population variance of every feature."""
+        if self.count == 0:
+            return np.zeros_like(self.mean)
+        # Removals can leave tiny negative rounding residue behind
+        return np.maximum(self._m2 / self.count, 0.0)
+
+    @property
+    def std(self) -> np.ndarray:
+        """Population standard deviation of every feature."""
+        return np.sqrt(self.variance)
+
+    def add(self, name: str, raw_vector: np.ndarray) -> None:
+        """Add the raw feature vector of an image, replacing an old one.
+
+        A replaced image keeps its position in the normalized output.
+        """
+        if name in self._vectors:
+            self._discard(self._vectors[name])
+        vector = np.asarray(raw_vector, dtype=np.float64)
+        if self.count == 0:
+            self.mean = np.zeros_like(vector)
+            self._m2 = np.zeros_like(vector)
+
+        # Welford update
+        self.count += 1
+        delta = vector - self.mean
+        self.mean = self.mean + delta / self.count
+        self._m2 = self._m2 + delta * (vector - self.mean)
+        self._vectors[name] = vector
+
+    def remove(self, name: str) -> None:
+        """Remove the feature vector of an image.
+
+        Raises:
+        KeyError: If the image is not tracked.
+        """
+        self._discard(self._vectors.pop(name))
+
+    def _discard(self, vector: np.ndarray) -> None:
+        """Take one vector out of the running statistics."""
+        if self.count == 1:
+            self.count = 0
+            self.mean = np.zeros_like(vector)
+            self._m2 = np.zeros_like(vector)
+            return
+
+        # Inverse Welford update
+        old_mean = self.mean
+        self.count -= 1
+        self.mean = (old_mean * (self.count + 1) - vector) / self.count
+        self._m2 = self._m2 - (vector - self.mean) * (vector - old_mean)
+
+    def update(self, items: Iterable[Tuple[str, np.ndarray]]) -> None:
+        """Add or replace several (name, raw_vector) pairs."""
+        for name, raw_vector in items:
+            self.add(name, raw_vector)
+
+    def recompute(self) -> None:
+        """Recompute the statistics exactly from the stored vectors.
+
+        Long add/remove sequences accumulate rounding error, calling this
+        once in a while resets it.
+        """
+        if not self._vectors:
+            return
+        all_features_array = np.array(list(self._vectors.values()))
+        self.count = len(all_features_array)
+        self.mean = np.mean(all_features_array, axis=0)
+        self._m2 = np.var(all_features_array, axis=0) * self.count
+
+    def normalize(self, raw_vector: np.ndarray) -> np.ndarray:
+        """Z-score normalize one raw vector with the current statistics."""
+        vector = np.asarray(raw_vector, dtype=np.float64)
+        return (vector - self.mean) / self.std
+
+    def normalized(self) -> Dict[str, List[float]]:
+        """Return every tracked image with its Z-score normalized vector.
+
+        Returns:
+        feature_dict (dict): Same layout as extract_image_features.
+        """
+        return self.normalized_table().to_dict()
+
+    def normalized_table(self) -> FeatureTable:
+        """Return the Z-score normalized vectors as a FeatureTable."""
+        if not self._vectors:
+            return FeatureTable([], np.empty((0, 0)))
+        z_score_features = np.array(list(self._vectors.values()))
+        z_score_features -= self.mean
+        z_score_features /= self.std
+        return FeatureTable(list(self._vectors), z_score_features)
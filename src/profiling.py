@@ -0,0 +1,184 @@
+"""Optional timing and memory instrumentation of the pipeline.
+
+Pass a PipelineStats as the stats argument of extract_image_features,
+compute_similarity, plot_heatmap or MainWindow.save_images to see where
+a run spends its time. Stages are named hierarchically:
+
+    extract                  whole feature extraction
+    extract.decode           cv2.imread, bytes read on cache misses
+    extract.color            mean and variance of the BGR and HSV images
+    extract.canny            edge map
+    extract.laplacian        grayscale Laplacian
+    normalize                Z-score normalization
+    similarity               cosine similarity matrix
+    heatmap                  rendering and saving the heatmap
+    save                     writing the GUI crops, bytes written
+
+With workers the extract.* stages run in other processes and are not
+recorded, extract still is. Without stats every instrumented block is a
+shared no-op context manager, so the cost is a few hundred nanoseconds
+per image.
+"""
+
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore # noqa
+
+# Returned by stage() when profiling is off
+_DISABLED: AbstractContextManager[None] = nullcontext()
+
+# Measurement of a running stage, see PipelineStats.stage
+StageRecord = Dict[str, int]
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Return the peak resident memory of the process, if available."""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) * 1024
+
+
+class PipelineStats:
+    """Per-stage wall time, item counts, bytes moved and peak memory.
+
+    Thread safe, so the GUI save workers can report into it.
+    """
+
+    def __init__(
+        self,
+        callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        track_allocations: bool = False,
+    ) -> None:
+        """Create empty statistics.
+
+        Args:
+        callback (callable, optional): Called with the stage name and its
+        record (seconds, items, bytes_read, bytes_written) whenever a
+        stage finishes.
+        track_allocations (bool): Record the peak traced allocation of
+        every stage with tracemalloc. This slows the run down.
+        """
+        self.callback = callback
+        self.track_allocations = track_allocations
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(
+        self,
+        name: str,
+        seconds: float = 0.0,
+        items: int = 0,
+        bytes_read: int = 0,
+        bytes_written: int = 0,
+        peak_allocated: Optional[int] = None,
+    ) -> None:
+        """Add one measurement to a stage."""
+        with self._lock:
+            record = self.stages.setdefault(
+                name,
+                {
+                    "calls": 0,
+                    "seconds": 0.0,
+                    "items": 0,
+                    "bytes_read": 0,
+                    "bytes_written": 0,
+                },
+            )
+            record["calls"] += 1
+            record["seconds"] += seconds
+            record["items"] += items
+            record["bytes_read"] += bytes_read
+            record["bytes_written"] += bytes_written
+            if peak_allocated is not None:
+                record["peak_allocated_bytes"] = max(
+                    record.get("peak_allocated_bytes", 0), peak_allocated
+                )
+        if self.callback is not None:
+            self.callback(
+                name,
+                {
+                    "seconds": seconds,
+                    "items": items,
+                    "bytes_read": bytes_read,
+                    "bytes_written": bytes_written,
+                },
+            )
+
+    def count(self, name: str, n: int = 1) -> None:
+        """Increase a counter, e.g. cache hits."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def stage(
+        self, name: str, items: int = 0, bytes_read: int = 0
+    ) -> Iterator[StageRecord]:
+        """Time a block of code as one call of a stage.
+
+        Yields the items, bytes_read and bytes_written of the call, which
+        the block may update once they are known.
+        """
+        record = {
+            "items": items,
+            "bytes_read": bytes_read,
+            "bytes_written": 0,
+        }
+        tracing = self.track_allocations and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            peak_allocated = None
+            if tracing:
+                _, peak_allocated = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            self.add(
+                name,
+                seconds,
+                record["items"],
+                record["bytes_read"],
+                record["bytes_written"],
+                peak_allocated,
+            )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the statistics as a JSON serializable report."""
+        with self._lock:
+            return {
+                "stages": {
+                    name: dict(record) for name, record in self.stages.items()
+                },
+                "counters": dict(self.counters),
+                "peak_rss_bytes": peak_rss_bytes(),
+            }
+
+    def dump(self, path: str) -> None:
+        """Write the report as JSON."""
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+            f.write("\n")
+
+
+def stage(
+    stats: Optional[PipelineStats],
+    name: str,
+    items: int = 0,
+    bytes_read: int = 0,
+) -> AbstractContextManager[Optional[StageRecord]]:
+    """Return stats.stage(...), or a no-op yielding None without stats."""
+    if stats is None:
+        return _DISABLED
+    return stats.stage(name, items, bytes_read)
@@ -0,0 +1,147 @@
+"""Crop and write bounding boxes on a background thread pool.
+
+QPixmap may only be used on the GUI thread, so the crops are taken from
+a QImage copy of the loaded image. Every crop is an independent task, so
+the PNG encoding of many boxes runs in parallel while the window keeps
+processing events.
+"""
+
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from PyQt5.QtCore import QObject, QRect, QRunnable, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QImage
+
+if TYPE_CHECKING:
+    from profiling import PipelineStats
+
+
+class SaveSignals(QObject):
+    """Signals of a SaveJob, delivered on the thread that owns them."""
+
+    # Number of finished crops and total number of crops
+    progress = pyqtSignal(int, int)
+    # Number of written crops and paths that could not be written
+    finished = pyqtSignal(int, list)
+
+
+class _CropTask(QRunnable):
+    """Crop one box of the image and write it as a PNG."""
+
+    def __init__(self, job: "SaveJob", rect: QRect, path: str) -> None:
+        super().__init__()
+        self.job = job
+        self.rect = rect
+        self.path = path
+
+    def run(self) -> None:
+        """Write the crop unless the job was cancelled."""
+        written = False
+        if not self.job.cancelled:
+            written = self.job.image.copy(self.rect).save(self.path)
+        size = 0
+        if written and self.job.stats is not None:
+            size = os.path.getsize(self.path)
+        self.job._task_done(self.path, written, size)
+
+
+class SaveJob:
+    """Write the crops of an image on a thread pool.
+
+    Progress and completion are reported through the progress and
+    finished signals of self.signals. Cancelling skips the crops that
+    have not been started yet; finished is still emitted once.
+    """
+
+    def __init__(
+        self,
+        image: QImage,
+        crops: List[Tuple[QRect, str]],
+        pool: Optional[QThreadPool] = None,
+        stats: Optional["PipelineStats"] = None,
+    ) -> None:
+        """Prepare a save job.
+
+        Args:
+        image (QImage): Image to crop from. It is shared read-only by
+        the worker threads.
+        crops (list): (rectangle in image pixels, output path) pairs.
+        pool (QThreadPool, optional): Pool running the crop tasks,
+        defaults to the global instance.
+        stats (PipelineStats, optional): Receives one save stage when the
+        job finishes, with the written crops and their bytes on disk.
+        """
+        self.image = image
+        self.crops = crops
+        if pool is None:
+            pool = QThreadPool.globalInstance()
+            assert pool is not None
+        self.pool = pool
+        self.signals = SaveSignals()
+        self.total = len(crops)
+        self.written = 0
+        self.failed: List[str] = []
+        self.stats = stats
+        self._done = 0
+        self._bytes = 0
+        self._start_time = 0.0
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+
+    def start(self) -> None:
+        """Queue one task per crop on the pool."""
+        self._start_time = time.perf_counter()
+        if not self.crops:
+            self._record()
+            self.signals.finished.emit(0, [])
+            self._finished.set()
+            return
+        for rect, path in self.crops:
+            self.pool.start(_CropTask(self, rect, path))
+
+    def cancel(self) -> None:
+        """Skip the crops that have not been started yet."""
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether cancel was called."""
+        return self._cancel.is_set()
+
+    def is_finished(self) -> bool:
+        """Whether every task has run or been skipped."""
+        return self._finished.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the job is finished, return False on timeout."""
+        return self._finished.wait(timeout)
+
+    def _record(self) -> None:
+        """Add the save stage to stats, if any."""
+        if self.stats is not None:
+            self.stats.add(
+                "save",
+                time.perf_counter() - self._start_time,
+                items=self.written,
+                bytes_written=self._bytes,
+            )
+
+    def _task_done(self, path: str, written: bool, size: int = 0) -> None:
+        """Count a finished task, called from the worker threads."""
+        with self._lock:
+            self._done += 1
+            if written:
+                self.written += 1
+                self._bytes += size
+            elif not self.cancelled:
+                self.failed.append(path)
+            done = self._done
+        self.signals.progress.emit(done, self.total)
+        if done == self.total:
+            self._record()
+            # Queue the signal first, so it is pending once wait returns
+            self.signals.finished.emit(self.written, list(self.failed))
+            self._finished.set()
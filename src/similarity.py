@@ -0,0 +1,275 @@
+"""Blocked cosine similarity and top-k queries for large slice sets."""
+
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from numpy.typing import DTypeLike
+
+from feature_table import FeatureTable
+
+Features = Union[Dict[str, List[float]], FeatureTable, np.ndarray]
+BlockCallback = Callable[[int, np.ndarray], None]
+
+
+def _as_matrix(
+    features: Features, dtype: DTypeLike = np.float64
+) -> np.ndarray:
+    """Return the feature vectors as an (N, D) array of dtype."""
+    if isinstance(features, FeatureTable):
+        return features.matrix.astype(dtype, copy=False)
+    if isinstance(features, dict):
+        return np.array(list(features.values()), dtype=dtype)
+    return np.asarray(features, dtype=dtype)
+
+
+def normalize_rows(
+    features: Features, dtype: DTypeLike = np.float64
+) -> np.ndarray:
+    """L2-normalize every feature vector once.
+
+    Args:
+    features (dict, FeatureTable or ndarray): Feature dictionary as
+    returned by extract_image_features, a FeatureTable, or an (N, D)
+    array.
+    dtype (dtype): Floating point type of the result.
+
+    Returns:
+    unit_vectors (ndarray): (N, D) array of unit length rows. Rows with
+    zero norm become NaN, like in compute_similarity.
+    """
+    feature_vectors = _as_matrix(features, dtype)
+    norm = np.linalg.norm(feature_vectors, axis=1)
+    return feature_vectors / norm[:, np.newaxis]
+
+
+def iter_similarity_blocks(
+    features: Features,
+    block_size: int = 1024,
+    dtype: DTypeLike = np.float64,
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """Yield the cosine similarity matrix one block of rows at a time.
+
+    Args:
+    features (dict or ndarray): Feature vectors, see normalize_rows.
+    block_size (int): Number of rows per block.
+    dtype (dtype): Floating point type used for the product.
+
+    Yields:
+    (start, block): Index of the first row and the (rows, N) block of
+    the similarity matrix. Only one block is alive at a time.
+    """
+    unit_vectors = normalize_rows(features, dtype)
+    for start in range(0, len(unit_vectors), block_size):
+        block = unit_vectors[start : start + block_size]
+        yield start, block @ unit_vectors.T
+
+
+def blocked_similarity(
+    features: Features,
+    block_size: int = 1024,
+    dtype: DTypeLike = np.float64,
+    out: Optional[str] = None,
+    callback: Optional[BlockCallback] = None,
+) -> Optional[np.ndarray]:
+    """Compute cosine similarity in row blocks with bounded peak memory.
+
+    Rows are normalized once and the N x N matrix is produced block by
+    block, so the working memory is block_size x N instead of N x N.
+
+    Args:
+    features (dict or ndarray): Feature vectors, see normalize_rows.
+    block_size (int): Number of rows computed per matrix product.
+    dtype (dtype): np.float32 halves the memory of np.float64.
+    out (str, optional): Path of a .npy file the blocks are written to
+    through a memory map. It can be reopened with
+    np.load(out, mmap_mode="r").
+    callback (callable, optional): Called as callback(start, block) for
+    every block, for consumers that stream the matrix.
+
+    Returns:
+    similarity_matrix (ndarray or None): The memory mapped matrix when
+    out is given, None when only callback is given, else the in-memory
+    matrix.
+    """
+    feature_vectors = _as_matrix(features, dtype)
+    n = len(feature_vectors)
+
+    similarity_matrix: Optional[np.ndarray] = None
+    if out is not None:
+        similarity_matrix = np.lib.format.open_memmap(
+            out, mode="w+", dtype=dtype, shape=(n, n)
+        )
+    elif callback is None:
+        similarity_matrix = np.empty((n, n), dtype=dtype)
+
+    for start, block in iter_similarity_blocks(
+        feature_vectors, block_size, dtype
+    ):
+        if similarity_matrix is not None:
+            similarity_matrix[start : start + len(block)] = block
+        if callback is not None:
+            callback(start, block)
+
+    if isinstance(similarity_matrix, np.memmap):
+        similarity_matrix.flush()
+    return similarity_matrix
+
+
+def condensed_similarity(
+    features: Features,
+    block_size: int = 1024,
+    dtype: DTypeLike = np.float64,
+) -> np.ndarray:
+    """Compute the upper triangle of the cosine similarity matrix.
+
+    Every row block is only multiplied with the rows from its first row
+    on, so about half of the N x N products are computed and no N x N
+    matrix is allocated.
+
+    Args:
+    features (dict or ndarray): Feature vectors, see normalize_rows.
+    block_size (int): Number of rows per matrix product.
+    dtype (dtype): Floating point type used for the product.
+
+    Returns:
+    condensed (ndarray): The N * (N - 1) / 2 entries above the diagonal,
+    row by row, in the order of np.triu_indices(N, k=1) and
+    scipy.spatial.distance.squareform.
+    """
+    unit_vectors = normalize_rows(features, dtype)
+    n = len(unit_vectors)
+    condensed = np.empty(n * (n - 1) // 2, dtype=dtype)
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        # Columns start + 1 and up, the rest is below the diagonal
+        block = unit_vectors[start:stop] @ unit_vectors[start + 1 :].T
+        for row in range(start, stop):
+            offset = row * (2 * n - row - 1) // 2
+            condensed[offset : offset + n - row - 1] = block[
+                row - start, row - start :
+            ]
+    return condensed
+
+
+def _top_k_rows(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the k best columns of every row, best first."""
+    # argpartition on the negated scores puts NaN last, after every number
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(candidates, order, axis=1),
+        np.take_along_axis(candidate_scores, order, axis=1),
+    )
+
+
+def top_k_similar(
+    features: Features,
+    k: int,
+    block_size: int = 1024,
+    dtype: DTypeLike = np.float64,
+    include_self: bool = False,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Find the k most similar vectors of every vector.
+
+    The similarity matrix is computed in row blocks and reduced with
+    argpartition right away, so memory is O(N * k + block_size * N)
+    instead of O(N^2).
+
+    Args:
+    features (dict or ndarray): Feature vectors, see normalize_rows.
+    k (int): Number of neighbours per vector. It is capped at the number
+    of candidates.
+    block_size (int): Number of rows per matrix product.
+    dtype (dtype): Floating point type used for the product.
+    include_self (bool): Whether a vector may be its own neighbour.
+
+    Returns:
+    (indices, scores): (N, k) arrays of neighbour row indices and their
+    cosine similarity, sorted from most to least similar. Row indices
+    follow the order of the feature dictionary.
+    """
+    n = len(features)
+    k = min(k, n if include_self else n - 1)
+    indices = np.empty((n, max(k, 0)), dtype=np.int64)
+    scores = np.empty((n, max(k, 0)), dtype=dtype)
+    if k <= 0:
+        return indices, scores
+
+    for start, block in iter_similarity_blocks(features, block_size, dtype):
+        if not include_self:
+            rows = np.arange(len(block))
+            block[rows, start + rows] = -np.inf
+        stop = start + len(block)
+        indices[start:stop], scores[start:stop] = _top_k_rows(block, k)
+    return indices, scores
+
+
+def top_k_similar_to(
+    features: Features,
+    query_vector: Union[List[float], np.ndarray],
+    k: int,
+    block_size: int = 65536,
+    dtype: DTypeLike = np.float64,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Find the k vectors most similar to a single query vector.
+
+    Args:
+    features (dict or ndarray): Feature vectors, see normalize_rows.
+    query_vector (list or ndarray): Vector normalized the same way as
+    features.
+    k (int): Number of neighbours. It is capped at the number of vectors.
+    block_size (int): Number of library vectors scored at a time.
+    dtype (dtype): Floating point type used for the product.
+
+    Returns:
+    (indices, scores): Arrays of length k with the row indices of the
+    neighbours and their cosine similarity, most similar first.
+    """
+    query = np.asarray(query_vector, dtype=dtype)
+    return scan_top_k(
+        normalize_rows(features, dtype),
+        query / np.linalg.norm(query),
+        k,
+        block_size,
+    )
+
+
+def scan_top_k(
+    unit_vectors: np.ndarray,
+    unit_query: np.ndarray,
+    k: int,
+    block_size: int = 65536,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Scan already normalized vectors for the k best matches of a query.
+
+    The vectors are read block by block, so a memory mapped library is
+    never loaded as a whole.
+
+    Args:
+    unit_vectors (ndarray): (N, D) array of unit length rows.
+    unit_query (ndarray): Unit length query vector of length D.
+    k (int): Number of neighbours. It is capped at N.
+    block_size (int): Number of rows scored at a time.
+
+    Returns:
+    (indices, scores): See top_k_similar_to.
+    """
+    k = min(k, len(unit_vectors))
+    best_indices = np.empty(0, dtype=np.int64)
+    best_scores = np.empty(0, dtype=unit_query.dtype)
+    if k <= 0:
+        return best_indices, best_scores
+
+    # Keep a running top k while scanning the library in blocks
+    for start in range(0, len(unit_vectors), block_size):
+        block_scores = unit_vectors[start : start + block_size] @ unit_query
+        candidate_indices = np.concatenate(
+            [best_indices, start + np.arange(len(block_scores))]
+        )
+        candidate_scores = np.concatenate([best_scores, block_scores])
+        kk = min(k, len(candidate_scores))
+        top, top_scores = _top_k_rows(candidate_scores[np.newaxis], kk)
+        best_indices = candidate_indices[top[0]]
+        best_scores = top_scores[0]
+    return best_indices, best_scores
@@ -0,0 +1,316 @@
+"""Persistent cosine similarity index over a slice library."""
+
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from property_calculation import (
+    FEATURE_VERSION,
+    extract_raw_features,
+    read_feature_vector,
+)
+from similarity import scan_top_k
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore # noqa
+
+# Version 2 records the committed row count in meta.json
+INDEX_VERSION = 2
+META_FILE = "meta.json"
+VECTORS_FILE = "vectors.f32"
+NAMES_FILE = "names.txt"
+# Held while appending, so handles in other processes take turns
+LOCK_FILE = "index.lock"
+
+
+class SimilarityIndex:
+    """Memory mapped index of L2-normalized float32 feature vectors.
+
+    An index is a directory holding three files:
+
+    - meta.json: feature dimension, the Z-score statistics used to
+      normalize the library and the number of committed rows.
+    - vectors.f32: raw little-endian float32 rows, one unit vector per
+      slice, opened with np.memmap.
+    - names.txt: one UTF-8 filename per line, in row order.
+
+    Opening only reads the small metadata file, and both data files are
+    append-only, so new slices are added without rewriting the library.
+    An append writes both data files first and commits the new row count
+    by replacing meta.json last, so an interrupted append leaves the
+    previous rows intact and is discarded by the next one. Appends hold
+    an exclusive lock on index.lock and reread the committed count, so
+    several handles and processes can append to one index. The Z-score
+    statistics are frozen when the index is created, and appended slices
+    are normalized with them.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open an existing index directory.
+
+        Args:
+        path (str): Directory created by SimilarityIndex.create.
+
+        Raises:
+        ValueError: If the index was built with another format or
+        feature version.
+        """
+        self.path = path
+        self._load_meta()
+        meta = self._meta
+        if meta["feature_version"] != FEATURE_VERSION:
+            raise ValueError(
+                "Index was built with feature version "
+                f"{meta['feature_version']}, rebuild it"
+            )
+        self.dim: int = meta["dim"]
+        self.mean = np.array(meta["mean"], dtype=np.float64)
+        self.std = np.array(meta["std"], dtype=np.float64)
+        self._vectors: Optional[np.ndarray] = None
+        self._names: Optional[List[str]] = None
+
+    def _load_meta(self) -> None:
+        """Read meta.json and the committed row count."""
+        with open(os.path.join(self.path, META_FILE)) as f:
+            self._meta = json.load(f)
+        if self._meta["version"] != INDEX_VERSION:
+            raise ValueError(
+                f"Unsupported index version {self._meta['version']}"
+            )
+        self._count: int = self._meta["count"]
+        self._names_bytes: int = self._meta["names_bytes"]
+
+    def _write_meta(self, count: int, names_bytes: int) -> None:
+        """Atomically replace meta.json, committing the row count."""
+        meta = dict(self._meta, count=count, names_bytes=names_bytes)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".json")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, os.path.join(self.path, META_FILE))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._meta = meta
+        self._count = count
+        self._names_bytes = names_bytes
+
+    @classmethod
+    def create(
+        cls,
+        path: str,
+        raw_features: Dict[str, np.ndarray],
+    ) -> "SimilarityIndex":
+        """Create an index from raw feature vectors.
+
+        The vectors are Z-score normalized like in extract_image_features
+        and the statistics are kept for later queries and appends.
+
+        Args:
+        path (str): Directory to create. Existing index files in it are
+        overwritten.
+        raw_features (dict): Image names mapped to raw feature vectors,
+        as returned by extract_raw_features.
+
+        Returns:
+        index (SimilarityIndex): The opened index.
+        """
+        all_features_array = np.array(list(raw_features.values()))
+        if all_features_array.ndim != 2 or not len(all_features_array):
+            raise ValueError("Cannot build an index without images")
+        mean = np.mean(all_features_array, axis=0)
+        std = np.std(all_features_array, axis=0)
+
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, META_FILE), "w") as f:
+            json.dump(
+                {
+                    "version": INDEX_VERSION,
+                    "feature_version": FEATURE_VERSION,
+                    "dim": all_features_array.shape[1],
+                    "mean": mean.tolist(),
+                    "std": std.tolist(),
+                    "count": 0,
+                    "names_bytes": 0,
+                },
+                f,
+            )
+        # Truncate the data files, add() appends to them
+        open(os.path.join(path, VECTORS_FILE), "wb").close()
+        open(os.path.join(path, NAMES_FILE), "w").close()
+
+        index = cls(path)
+        index.add(raw_features.items())
+        return index
+
+    @classmethod
+    def from_folder(
+        cls,
+        path: str,
+        folder_path: str,
+        workers: Optional[int] = 1,
+        cache_path: Optional[str] = None,
+    ) -> "SimilarityIndex":
+        """Create an index from the images in a folder.
+
+        Args:
+        path (str): Directory to create.
+        folder_path (str): Path to the folder containing images.
+        workers (int, optional): See extract_raw_features.
+        cache_path (str, optional): See extract_raw_features.
+
+        Returns:
+        index (SimilarityIndex): The opened index.
+        """
+        return cls.create(
+            path, extract_raw_features(folder_path, workers, cache_path)
+        )
+
+    def __len__(self) -> int:
+        """Return the number of committed slices in the index."""
+        return self._count
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Memory map of the (N, D) unit vectors."""
+        if self._vectors is None:
+            n = len(self)
+            if n == 0:
+                return np.empty((0, self.dim), dtype="<f4")
+            self._vectors = np.memmap(
+                os.path.join(self.path, VECTORS_FILE),
+                dtype="<f4",
+                mode="r",
+                shape=(n, self.dim),
+            )
+        return self._vectors
+
+    @property
+    def names(self) -> List[str]:
+        """Filenames of the slices, in row order."""
+        if self._names is None:
+            with open(os.path.join(self.path, NAMES_FILE), "rb") as f:
+                self._names = (
+                    f.read(self._names_bytes).decode("utf-8").splitlines()
+                )
+        return self._names
+
+    def _unit_vectors(self, raw_vectors: np.ndarray) -> np.ndarray:
+        """Z-score with the index statistics and L2-normalize rows."""
+        z_score_features = (raw_vectors - self.mean) / self.std
+        norm = np.linalg.norm(z_score_features, axis=-1, keepdims=True)
+        return (z_score_features / norm).astype("<f4")
+
+    def add(self, raw_features: Iterable[Tuple[str, np.ndarray]]) -> None:
+        """Append (name, raw_vector) pairs to the index."""
+        items = list(raw_features)
+        if not items:
+            return
+        names = [name for name, _ in items]
+        if any("\n" in name for name in names):
+            raise ValueError("Slice names cannot contain newlines")
+        unit_vectors = self._unit_vectors(
+            np.array([raw_vector for _, raw_vector in items])
+        )
+        names_blob = "".join(f"{name}\n" for name in names).encode("utf-8")
+        with _locked(os.path.join(self.path, LOCK_FILE)):
+            # Other handles may have committed rows since this one read
+            # meta.json
+            count = self._count
+            self._load_meta()
+            if self._count != count:
+                self._names = None
+            # Truncating first drops the rows of an interrupted append
+            _append(
+                os.path.join(self.path, VECTORS_FILE),
+                self._count * self.dim * 4,
+                unit_vectors.tobytes(),
+            )
+            _append(
+                os.path.join(self.path, NAMES_FILE),
+                self._names_bytes,
+                names_blob,
+            )
+            self._write_meta(
+                self._count + len(items), self._names_bytes + len(names_blob)
+            )
+
+        # The memory map has a fixed length, reopen it on next access
+        self._vectors = None
+        if self._names is not None:
+            self._names.extend(names)
+
+    def add_images(self, image_paths: Iterable[str]) -> List[str]:
+        """Featurize image files and append them under their basename.
+
+        Returns:
+        skipped (list): Paths of images that could not be read.
+        """
+        items = []
+        skipped = []
+        for image_path in image_paths:
+            raw_vector = read_feature_vector(image_path)
+            if raw_vector is None:
+                skipped.append(image_path)
+            else:
+                items.append((os.path.basename(image_path), raw_vector))
+        self.add(items)
+        return skipped
+
+    def query_vector(
+        self, raw_vector: np.ndarray, k: int = 10
+    ) -> List[Tuple[str, float]]:
+        """Return the k slices most similar to a raw feature vector.
+
+        Args:
+        raw_vector (ndarray): Raw (not normalized) feature vector.
+        k (int): Number of results.
+
+        Returns:
+        results (list): (filename, cosine similarity) pairs, most similar
+        first.
+        """
+        unit_query = self._unit_vectors(np.asarray(raw_vector))
+        indices, scores = scan_top_k(self.vectors, unit_query, k)
+        names = self.names
+        return [
+            (names[i], float(score))
+            for i, score in zip(indices, scores, strict=True)
+        ]
+
+    def query_image(
+        self, image_path: str, k: int = 10
+    ) -> List[Tuple[str, float]]:
+        """Return the k slices most similar to an image file.
+
+        Raises:
+        ValueError: If the image cannot be read.
+        """
+        raw_vector = read_feature_vector(image_path)
+        if raw_vector is None:
+            raise ValueError(f"Cannot read image {image_path}")
+        return self.query_vector(raw_vector, k)
+
+
+@contextmanager
+def _locked(lock_path: str) -> Iterator[None]:
+    """Hold an exclusive lock on a file, where the platform has flock."""
+    with open(lock_path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        # Closing the file releases the lock
+        yield
+
+
+def _append(path: str, committed_size: int, data: bytes) -> None:
+    """Write data to a file after its first committed_size bytes."""
+    with open(path, "r+b") as f:
+        f.truncate(committed_size)
+        f.seek(committed_size)
+        f.write(data)
@@ -0,0 +1,229 @@
+"""Single-file container of uncompressed slices.
+
+A slice pack replaces a folder of small PNG files by one file that is
+memory mapped, so reading a study costs one open and one mmap instead of
+a file system lookup and a zlib decode per slice:
+
+    offset 0   magic b"SLCPACK1"
+    offset 8   little-endian uint64 offset of the index
+    offset 64  pixel blocks, raw C-order uint8, each 64-byte aligned
+    index      UTF-8 JSON {"version": 1, "slices": [{"name", "offset",
+               "shape"}, ...]}
+
+The index is written last, so slices are streamed to disk one at a time.
+Convert a folder of slices from the command line with:
+
+    python src/slice_pack.py slices_from_GUI -o slices.slicepack
+"""
+
+import argparse
+import json
+import os
+import struct
+import tempfile
+from typing import (
+    IO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
+
+import numpy as np
+
+MAGIC = b"SLCPACK1"
+PACK_VERSION = 1
+PACK_EXTENSION = ".slicepack"
+# Pixel blocks start on this boundary, for aligned SIMD loads
+ALIGNMENT = 64
+_PREAMBLE = struct.Struct("<8sQ")
+
+
+def is_slice_pack(path: str) -> bool:
+    """Return whether path is a slice pack file."""
+    if not os.path.isfile(path):
+        return False
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class SlicePackWriter:
+    """Stream slices into a new pack file.
+
+    The pack is written to a temporary file next to path and moved into
+    place by close, so readers never see a partial pack. Use it as a
+    context manager.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Start a pack, replacing path once closed."""
+        self.path = path
+        self._slices: List[Dict[str, object]] = []
+        self._names: Set[str] = set()
+        folder = os.path.dirname(os.path.abspath(path))
+        fd, self._tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        self._file: Optional[IO[bytes]] = os.fdopen(fd, "wb")
+        self._file.write(bytes(ALIGNMENT))
+
+    def __enter__(self) -> "SlicePackWriter":
+        """Return the writer."""
+        return self
+
+    def __exit__(self, exc_type: object, exc: object, tb: object) -> None:
+        """Finish the pack, or discard it on error."""
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add(self, name: str, image: np.ndarray) -> None:
+        """Append a uint8 image under a unique name.
+
+        Raises:
+        ValueError: If the name is taken or the image is not uint8.
+        """
+        if self._file is None:
+            raise ValueError("Pack is closed")
+        if name in self._names:
+            raise ValueError(f"Duplicate slice name {name}")
+        if image.dtype != np.uint8:
+            raise ValueError(f"{name}: expected uint8 pixels")
+        offset = self._file.tell()
+        padding = -offset % ALIGNMENT
+        self._file.write(bytes(padding))
+        self._file.write(np.ascontiguousarray(image).tobytes())
+        self._slices.append(
+            {
+                "name": name,
+                "offset": offset + padding,
+                "shape": list(image.shape),
+            }
+        )
+        self._names.add(name)
+
+    def close(self) -> None:
+        """Write the index and move the pack into place."""
+        if self._file is None:
+            return
+        index_offset = self._file.tell()
+        self._file.write(
+            json.dumps(
+                {"version": PACK_VERSION, "slices": self._slices}
+            ).encode()
+        )
+        self._file.seek(0)
+        self._file.write(_PREAMBLE.pack(MAGIC, index_offset))
+        self._file.close()
+        self._file = None
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        """Discard the partial pack."""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.remove(self._tmp_path)
+
+
+def write_pack(path: str, slices: Iterable[Tuple[str, np.ndarray]]) -> int:
+    """Write (name, image) pairs to a pack and return their number."""
+    count = 0
+    with SlicePackWriter(path) as writer:
+        for name, image in slices:
+            writer.add(name, image)
+            count += 1
+    return count
+
+
+class SlicePack(Mapping[str, np.ndarray]):
+    """Read-only mapping of slice names to memory mapped images.
+
+    Opening reads the index and maps the file once. Every item is a
+    zero-copy read-only view of the map, in the order the slices were
+    written.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open a pack.
+
+        Raises:
+        ValueError: If the file is not a pack of a supported version.
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            preamble = f.read(_PREAMBLE.size)
+            if len(preamble) != _PREAMBLE.size or not preamble.startswith(
+                MAGIC
+            ):
+                raise ValueError(f"{path} is not a slice pack")
+            _, index_offset = _PREAMBLE.unpack(preamble)
+            f.seek(index_offset)
+            index = json.loads(f.read())
+        if index["version"] != PACK_VERSION:
+            raise ValueError(f"Unsupported pack version {index['version']}")
+        self._slices: Dict[str, Tuple[int, Tuple[int, ...]]] = {
+            entry["name"]: (entry["offset"], tuple(entry["shape"]))
+            for entry in index["slices"]
+        }
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Return a slice as a view of the memory map."""
+        offset, shape = self._slices[name]
+        size = int(np.prod(shape))
+        return self._data[offset : offset + size].reshape(shape)
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the slice names in pack order."""
+        return iter(self._slices)
+
+    def __len__(self) -> int:
+        """Return the number of slices."""
+        return len(self._slices)
+
+
+def pack_folder(folder_path: str, pack_path: str) -> int:
+    """Decode the images of a folder into a pack, in directory order.
+
+    Returns:
+    count (int): Number of packed images, unreadable ones are skipped.
+    """
+    import cv2
+
+    from property_calculation import scan_images
+
+    def iter_slices() -> Iterator[Tuple[str, np.ndarray]]:
+        """Yield the decoded images one at a time."""
+        for entry in scan_images(folder_path):
+            image = cv2.imread(entry.path)
+            if image is not None:
+                yield entry.name, image
+
+    return write_pack(pack_path, iter_slices())
+
+
+def main() -> None:
+    """Convert a folder of slices from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Convert a folder of slices into a slice pack."
+    )
+    parser.add_argument("folder", help="folder of slice images")
+    parser.add_argument(
+        "-o",
+        "--output",
+        help=f"pack to write (default: <folder>{PACK_EXTENSION})",
+    )
+    args = parser.parse_args()
+
+    output = args.output or args.folder.rstrip("/\\") + PACK_EXTENSION
+    count = pack_folder(args.folder, output)
+    print(f"{count} slices packed into {output}")
+
+
+if __name__ == "__main__":
+    main()
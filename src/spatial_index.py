@@ -0,0 +1,142 @@
+"""Uniform grid index for hit-testing many rectangles."""
+
+from typing import Dict, Iterable, List, Set, Tuple
+
+# (left, top, right, bottom) with the edges included, like the outline
+# QPainter.drawRect draws for QRect(left, top, right - left, bottom - top)
+Bounds = Tuple[int, int, int, int]
+
+# Items covering more cells are kept in a list scanned on every query,
+# so one huge box does not fill the whole grid
+MAX_CELLS_PER_ITEM = 64
+
+
+class GridIndex:
+    """Buckets rectangles by the grid cells they overlap.
+
+    Point and rectangle queries only look at the items of the cells they
+    touch, so with boxes spread over the image they cost about the same
+    for thousands of items as for ten. Results are sorted by item id,
+    which is the drawing order of DrawableLabel.
+    """
+
+    def __init__(self, cell_size: int = 64) -> None:
+        """Create an empty index.
+
+        Args:
+        cell_size (int): Side length of a grid cell, ideally around the
+        size of a typical rectangle.
+        """
+        self.cell_size = max(int(cell_size), 1)
+        self._bounds: Dict[int, Bounds] = {}
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+        self._large: Set[int] = set()
+
+    def __len__(self) -> int:
+        """Return the number of indexed items."""
+        return len(self._bounds)
+
+    def __contains__(self, item_id: object) -> bool:
+        """Return whether an item is indexed."""
+        return item_id in self._bounds
+
+    def _cell_range(self, bounds: Bounds) -> Tuple[range, range]:
+        """Return the column and row ranges of the cells under bounds."""
+        left, top, right, bottom = bounds
+        size = self.cell_size
+        return (
+            range(left // size, right // size + 1),
+            range(top // size, bottom // size + 1),
+        )
+
+    def insert(self, item_id: int, bounds: Bounds) -> None:
+        """Add or move an item."""
+        if item_id in self._bounds:
+            self.remove(item_id)
+        self._bounds[item_id] = bounds
+        cols, rows = self._cell_range(bounds)
+        if len(cols) * len(rows) > MAX_CELLS_PER_ITEM:
+            self._large.add(item_id)
+            return
+        for row in rows:
+            for col in cols:
+                self._cells.setdefault((col, row), set()).add(item_id)
+
+    def remove(self, item_id: int) -> None:
+        """Remove an item.
+
+        Raises:
+        KeyError: If the item is not indexed.
+        """
+        bounds = self._bounds.pop(item_id)
+        if item_id in self._large:
+            self._large.remove(item_id)
+            return
+        cols, rows = self._cell_range(bounds)
+        for row in rows:
+            for col in cols:
+                cell = self._cells[col, row]
+                cell.discard(item_id)
+                if not cell:
+                    del self._cells[col, row]
+
+    def clear(self) -> None:
+        """Remove every item."""
+        self._bounds.clear()
+        self._cells.clear()
+        self._large.clear()
+
+    def rebuild(self, items: Iterable[Tuple[int, Bounds]]) -> None:
+        """Replace the content of the index by (item_id, bounds) pairs."""
+        self.clear()
+        for item_id, bounds in items:
+            self.insert(item_id, bounds)
+
+    def _candidates(self, bounds: Bounds) -> Set[int]:
+        """Return the items sharing a cell with bounds."""
+        cols, rows = self._cell_range(bounds)
+        candidates = set(self._large)
+        if len(cols) * len(rows) > len(self._cells):
+            # Fewer occupied cells than queried ones, walk the cells
+            for (col, row), cell in self._cells.items():
+                if col in cols and row in rows:
+                    candidates |= cell
+            return candidates
+        for row in rows:
+            for col in cols:
+                items = self._cells.get((col, row))
+                if items:
+                    candidates |= items
+        return candidates
+
+    def query_point(self, x: int, y: int) -> List[int]:
+        """Return the ids of the items containing a point, sorted."""
+        return sorted(
+            item_id
+            for item_id in self._candidates((x, y, x, y))
+            if _contains(self._bounds[item_id], x, y)
+        )
+
+    def query_rect(self, bounds: Bounds) -> List[int]:
+        """Return the ids of the items intersecting bounds, sorted."""
+        return sorted(
+            item_id
+            for item_id in self._candidates(bounds)
+            if _intersects(self._bounds[item_id], bounds)
+        )
+
+
+def _contains(bounds: Bounds, x: int, y: int) -> bool:
+    """Return whether bounds contain a point."""
+    left, top, right, bottom = bounds
+    return left <= x <= right and top <= y <= bottom
+
+
+def _intersects(first: Bounds, second: Bounds) -> bool:
+    """Return whether two bounds overlap or touch."""
+    return (
+        first[0] <= second[2]
+        and second[0] <= first[2]
+        and first[1] <= second[3]
+        and second[1] <= first[3]
+    )
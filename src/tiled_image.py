@@ -0,0 +1,165 @@
+"""Multi-resolution tiles for viewing large images.
+
+An ImagePyramid holds the image and copies halved with cv2.pyrDown
+until the coarsest level fits in one tile. A viewer asks for the tiles
+covering the visible part of the image at the level matching its zoom,
+so painting costs about the same at every zoom level and only visible
+tiles are ever converted to QImage.
+"""
+
+import math
+from collections import OrderedDict
+from typing import Iterator, List, Tuple
+
+import cv2
+import numpy as np
+from PyQt5 import sip
+from PyQt5.QtCore import QRect
+from PyQt5.QtGui import QImage
+
+from image_cache import imread
+
+# Side length of a tile in pixels of its level
+TILE_SIZE = 512
+# Converted tiles kept in memory, about 200 MB of RGB tiles
+MAX_CACHED_TILES = 256
+
+
+class ImagePyramid:
+    """Level-of-detail pyramid of a BGR or grayscale image.
+
+    Level 0 is the full resolution image and level k is downsampled by
+    2**k. Tiles are converted to QImage on first use and kept in a small
+    LRU cache.
+    """
+
+    def __init__(self, image: np.ndarray, tile_size: int = TILE_SIZE) -> None:
+        """Build the pyramid levels of an image.
+
+        Args:
+        image (ndarray): BGR or grayscale image as returned by
+        cv2.imread.
+        tile_size (int): Side length of a tile.
+        """
+        self.tile_size = tile_size
+        self.levels: List[np.ndarray] = [np.ascontiguousarray(image)]
+        while max(self.levels[-1].shape[:2]) > tile_size:
+            self.levels.append(cv2.pyrDown(self.levels[-1]))
+        self._tiles: OrderedDict[Tuple[int, int, int], QImage] = OrderedDict()
+
+    @classmethod
+    def from_file(cls, path: str) -> "ImagePyramid":
+        """Decode an image file through the image cache and build its pyramid.
+
+        Raises:
+        ValueError: If the image cannot be read.
+        """
+        image = imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"Cannot read image {path}")
+        return cls(image)
+
+    @property
+    def width(self) -> int:
+        """Width of the full resolution image."""
+        return int(self.levels[0].shape[1])
+
+    @property
+    def height(self) -> int:
+        """Height of the full resolution image."""
+        return int(self.levels[0].shape[0])
+
+    def level_for_scale(self, scale: float) -> int:
+        """Return the coarsest level that still has enough detail.
+
+        Args:
+        scale (float): Screen pixels per full resolution pixel.
+        """
+        if scale >= 1:
+            return 0
+        level = int(math.floor(math.log2(1 / scale)))
+        return min(level, len(self.levels) - 1)
+
+    def visible_tiles(
+        self, level: int, rect: QRect
+    ) -> Iterator[Tuple[QRect, QImage]]:
+        """Yield the tiles of a level covering a full resolution rectangle.
+
+        Args:
+        level (int): Pyramid level.
+        rect (QRect): Visible area in full resolution pixels.
+
+        Yields:
+        (source_rect, tile): Area covered by the tile in full resolution
+        pixels and the tile itself.
+        """
+        factor = 2**level
+        step = self.tile_size * factor
+        rect = rect.intersected(QRect(0, 0, self.width, self.height))
+        if rect.isEmpty():
+            return
+        for row in range(rect.top() // step, rect.bottom() // step + 1):
+            for col in range(rect.left() // step, rect.right() // step + 1):
+                tile = self.tile(level, row, col)
+                yield (
+                    QRect(
+                        col * step,
+                        row * step,
+                        tile.width() * factor,
+                        tile.height() * factor,
+                    ),
+                    tile,
+                )
+
+    def tile(self, level: int, row: int, col: int) -> QImage:
+        """Return a tile of a level as QImage, converting it on first use."""
+        key = (level, row, col)
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            return tile
+
+        top = row * self.tile_size
+        left = col * self.tile_size
+        pixels = self.levels[level][
+            top : top + self.tile_size, left : left + self.tile_size
+        ]
+        tile = to_qimage(pixels)
+        self._tiles[key] = tile
+        if len(self._tiles) > MAX_CACHED_TILES:
+            self._tiles.popitem(last=False)
+        return tile
+
+    def qimage(self) -> QImage:
+        """Return the full resolution image as a QImage.
+
+        The QImage shares the pixels of level 0, so it is only valid as
+        long as the pyramid.
+        """
+        return to_qimage(self.levels[0], copy=False)
+
+
+def to_qimage(pixels: np.ndarray, copy: bool = True) -> QImage:
+    """Wrap a BGR or grayscale array in a QImage.
+
+    Args:
+    pixels (ndarray): Image array, rows may be strided.
+    copy (bool): Detach the QImage from the array. Without a copy the
+    array must outlive the QImage and be C-contiguous.
+    """
+    if copy:
+        pixels = np.ascontiguousarray(pixels)
+    height, width = pixels.shape[:2]
+    image_format = (
+        QImage.Format_Grayscale8  # type: ignore # noqa
+        if pixels.ndim == 2
+        else QImage.Format_BGR888  # type: ignore # noqa
+    )
+    image = QImage(
+        sip.voidptr(pixels.ctypes.data),
+        width,
+        height,
+        pixels.strides[0],
+        image_format,
+    )
+    return image.copy() if copy else image
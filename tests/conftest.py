@@ -0,0 +1,30 @@
+"""Shared test fixtures."""
+
+from pathlib import Path
+from typing import Callable, List
+
+import cv2
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def write_images(tmp_path: Path) -> Callable[..., List[str]]:
+    """Return a function writing random 32 x 32 images into tmp_path.
+
+    The function takes the file names and an optional seed, and returns
+    the paths of the written images.
+    """
+
+    def write(names: List[str], seed: int = 0) -> List[str]:
+        rng = np.random.default_rng(seed)
+        paths = []
+        for name in names:
+            path = str(tmp_path / name)
+            cv2.imwrite(
+                path, rng.integers(0, 256, (32, 32, 3), dtype=np.uint8)
+            )
+            paths.append(path)
+        return paths
+
+    return write
@@ -1,12 +1,20 @@
 """test for GUI."""
 
 import os
+from pathlib import Path
 
+import cv2
+import numpy as np
 import pytest
 from PyQt5.QtCore import QPoint, QRect, Qt
-from PyQt5.QtGui import QMouseEvent, QPixmap
+from PyQt5.QtGui import QColor, QImage, QMouseEvent, QPixmap
 from PyQt5.QtWidgets import QApplication
+from annotations import read_annotations
+from batch_crop import crop
+from profiling import PipelineStats
+from property_calculation import extract_feature_table
 from SegmentationGUI import DrawableLabel, MainWindow
+from tiled_image import ImagePyramid
 
 
 @pytest.fixture
@@ -79,6 +87,76 @@ def test_drawing_rectangle(drawable_label: DrawableLabel) -> None:
     assert drawable_label.rectangles[0][0].bottomRight() == QPoint(200, 200)
 
 
+def test_rubber_band_follows_mouse(drawable_label: DrawableLabel) -> None:
+    """Test the live rectangle and the cached overlay are painted."""
+    drawable_label.rectangles = [(QRect(10, 10, 50, 50), "item1")]
+    drawable_label.mousePressEvent(
+        QMouseEvent(
+            QMouseEvent.Type.MouseButtonPress,
+            QPoint(100, 100),
+            Qt.LeftButton,  # type: ignore # noqa
+            Qt.LeftButton,  # type: ignore # noqa
+            Qt.NoModifier,  # type: ignore # noqa
+        )
+    )
+    drawable_label.mouseMoveEvent(
+        QMouseEvent(
+            QMouseEvent.Type.MouseMove,
+            QPoint(300, 250),
+            Qt.LeftButton,  # type: ignore # noqa
+            Qt.LeftButton,  # type: ignore # noqa
+            Qt.NoModifier,  # type: ignore # noqa
+        )
+    )
+    assert drawable_label.end_point == QPoint(300, 250)
+
+    image = drawable_label.grab().toImage()
+    red = QColor(Qt.red).rgb()  # type: ignore # noqa
+    # Finished rectangle from the overlay and the rubber band
+    assert image.pixel(10, 30) == red
+    assert image.pixel(300, 200) == red
+    assert image.pixel(200, 50) != red
+
+    # Replacing the rectangles repaints the overlay from scratch
+    drawable_label.rectangles = []
+    assert drawable_label.grab().toImage().pixel(10, 30) != red
+
+
+def test_rectangle_hit_testing(drawable_label: DrawableLabel) -> None:
+    """Test finding and removing rectangles under the cursor."""
+    drawable_label.rectangles = [
+        (QRect(10, 10, 50, 50), "item1"),
+        (QRect(40, 40, 100, 100), "item2"),
+    ]
+    drawable_label.rectangles.append((QRect(500, 300, 20, 20), "item3"))
+
+    assert drawable_label.rectangle_at(QPoint(20, 20)) == 0
+    # Overlapping rectangles, the last drawn is on top
+    assert drawable_label.rectangle_at(QPoint(50, 50)) == 1
+    assert drawable_label.rectangle_at(QPoint(510, 310)) == 2
+    assert drawable_label.rectangle_at(QPoint(300, 300)) is None
+    assert drawable_label.rectangles_in(QRect(0, 0, 45, 45)) == [0, 1]
+
+    overlay = drawable_label._update_overlay()
+    index = drawable_label._index
+    assert overlay.toImage().pixelColor(10, 30).alpha() == 255
+
+    drawable_label.remove_rectangle(0)
+    assert drawable_label.rectangle_at(QPoint(20, 20)) is None
+    assert drawable_label.rectangle_at(QPoint(50, 50)) == 0
+    assert drawable_label.rectangle_at(QPoint(510, 310)) == 1
+    # The index and the overlay are patched, not rebuilt
+    assert drawable_label._index is index and len(index) == 2
+    assert drawable_label._update_overlay() is overlay
+    image = overlay.toImage()
+    assert image.pixelColor(10, 30).alpha() == 0
+    # The overlapping box is redrawn where the removed one covered it
+    assert image.pixelColor(40, 50).alpha() == 255
+
+    drawable_label.rectangles.append((QRect(10, 10, 5, 5), "item4"))
+    assert drawable_label.rectangle_at(QPoint(12, 12)) == 2
+
+
 def test_save_images(main_window: MainWindow) -> None:
     """Test saving images of bounding boxes to a test-specific directory."""
     # Set up the image and rectangles manually
@@ -90,10 +168,205 @@ def test_save_images(main_window: MainWindow) -> None:
     ]
 
     # Trigger the saving logic
-    main_window.save_images()
+    stats = PipelineStats()
+    main_window.save_images(stats=stats)
+    main_window.wait_for_save()
 
     directory = "tests/test_save"
 
     # Check that files are created in the correct directory
     assert os.path.exists(os.path.join(directory, "bbox_1.png"))
     assert os.path.exists(os.path.join(directory, "bbox_2.png"))
+    assert os.path.exists(os.path.join(directory, "annotations.csv"))
+
+    # The save stage reports the crops and their bytes on disk
+    assert stats.stages["save"]["items"] == 2
+    assert stats.stages["save"]["bytes_read"] == 0
+    assert stats.stages["save"]["bytes_written"] == sum(
+        os.path.getsize(os.path.join(directory, f"bbox_{i}.png"))
+        for i in (1, 2)
+    )
+
+
+def test_export_import_annotations(
+    main_window: MainWindow, tmp_path: Path
+) -> None:
+    """Test rectangles survive an export and import in image pixels."""
+    main_window.image_label.rectangles = [
+        (QRect(10, 10, 50, 50), "item1"),
+        (QRect(60, 60, 100, 100), "item2"),
+    ]
+    expected = main_window.annotations()
+    path = str(tmp_path / "boxes.csv")
+
+    main_window.export_annotations(path)
+    main_window.image_label.rectangles = []
+    main_window.import_annotations(path)
+
+    assert [name for _, name in main_window.image_label.rectangles] == [
+        "item1",
+        "item2",
+    ]
+    # The label has fewer pixels than the image, so a box can move by up
+    # to one label pixel (1.2 image pixels here)
+    for restored, annotation in zip(
+        main_window.annotations(), expected, strict=True
+    ):
+        assert restored.name == annotation.name
+        for value, expected_value in zip(
+            restored[2:], annotation[2:], strict=True
+        ):
+            assert abs(value - expected_value) <= 2
+    assert [annotation[1:] for annotation in read_annotations(path)] == [
+        annotation[1:] for annotation in expected
+    ]
+
+
+def test_analyze_boxes_matches_saved_crops(
+    main_window: MainWindow, tmp_path: Path
+) -> None:
+    """Test in-memory box features equal features of the saved PNGs."""
+    pixels = np.random.default_rng(0).integers(
+        0, 256, (600, 800, 3), dtype=np.uint8
+    )
+    image = QImage(pixels.data, 800, 600, 800 * 3, QImage.Format_RGB888)  # type: ignore # noqa
+    main_window.image = QPixmap.fromImage(image)
+    main_window.image_label.setPixmap(main_window.image)
+    main_window.image_label.rectangles = [
+        (QRect(10, 10, 50, 50), "item1"),
+        (QRect(60, 60, 100, 100), "item2"),
+        (QRect(300, 200, 120, 80), "item3"),
+    ]
+    main_window.output_directory = str(tmp_path)
+
+    np.testing.assert_array_equal(main_window.image_array(), pixels[..., ::-1])
+    main_window.save_images(pack=True)
+    main_window.wait_for_save()
+    expected = extract_feature_table(str(tmp_path))
+    feature_table = main_window.analyze_boxes()
+    pack_table = extract_feature_table(str(tmp_path / "slices.slicepack"))
+
+    assert sorted(feature_table) == sorted(expected)
+    assert sorted(pack_table) == sorted(expected)
+    for filename in expected:
+        np.testing.assert_allclose(
+            feature_table.row(filename), expected.row(filename), rtol=1e-12
+        )
+        np.testing.assert_allclose(
+            pack_table.row(filename), expected.row(filename), rtol=1e-12
+        )
+
+
+def test_save_clips_boxes_to_image(
+    main_window: MainWindow, tmp_path: Path
+) -> None:
+    """Test boxes past the edge are clipped and empty boxes skipped."""
+    pixels = np.random.default_rng(0).integers(
+        0, 256, (600, 800, 3), dtype=np.uint8
+    )
+    image = QImage(pixels.data, 800, 600, 800 * 3, QImage.Format_RGB888)  # type: ignore # noqa
+    main_window.image = QPixmap.fromImage(image)
+    main_window.image_label.setPixmap(main_window.image)
+    main_window.image_label.rectangles = [
+        (QRect(700, 400, 200, 200), "item1"),
+        # A click without drag, zero image pixels wide
+        (QRect(QPoint(100, 100), QPoint(100, 100)), "item2"),
+        (QRect(300, 200, 120, 80), "item3"),
+    ]
+    main_window.output_directory = str(tmp_path)
+
+    main_window.save_images()
+    main_window.wait_for_save()
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "annotations.csv",
+        "bbox_1.png",
+        "bbox_3.png",
+    ]
+    annotation = main_window.annotations()[0]
+    saved = cv2.imread(str(tmp_path / "bbox_1.png"))
+    np.testing.assert_array_equal(
+        saved, crop(main_window.image_array(), annotation)
+    )
+    expected = extract_feature_table(str(tmp_path))
+    feature_table = main_window.analyze_boxes()
+    assert sorted(feature_table) == sorted(expected)
+    for filename in expected:
+        np.testing.assert_allclose(
+            feature_table.row(filename), expected.row(filename), rtol=1e-12
+        )
+
+
+def test_cancel_save(main_window: MainWindow, tmp_path: Path) -> None:
+    """Test a cancelled save skips the crops that were not started."""
+    main_window.output_directory = str(tmp_path)
+    main_window.image_label.rectangles = [
+        (QRect(i, i, 50, 50), f"item{i + 1}") for i in range(200)
+    ]
+    main_window.save_pool.setMaxThreadCount(1)
+
+    save_job = main_window.save_images()
+    assert save_job is not None
+    save_job.cancel()
+    main_window.wait_for_save()
+
+    assert save_job.is_finished()
+    assert not save_job.failed
+    assert save_job.written < 200
+    assert len(list(tmp_path.glob("bbox_*.png"))) == save_job.written
+    assert "cancelled" in main_window.statusBar().currentMessage()
+
+
+def test_tiled_image_boxes(main_window: MainWindow, tmp_path: Path) -> None:
+    """Test boxes drawn on a zoomed tiled image map to image pixels."""
+    pixels = np.random.default_rng(0).integers(
+        0, 256, (3000, 4000, 3), dtype=np.uint8
+    )
+    main_window.show_pyramid(ImagePyramid(pixels))
+    label = main_window.image_label
+    main_window.output_directory = str(tmp_path)
+
+    # Zoom in 4 times around the label origin, one label pixel is then
+    # 1.5 image pixels instead of 6
+    label.zoom_at(QPoint(0, 0), 4.0)
+    for event_type, pos in [
+        (QMouseEvent.Type.MouseButtonPress, QPoint(100, 100)),
+        (QMouseEvent.Type.MouseMove, QPoint(200, 150)),
+        (QMouseEvent.Type.MouseButtonRelease, QPoint(200, 150)),
+    ]:
+        handler = {
+            QMouseEvent.Type.MouseButtonPress: label.mousePressEvent,
+            QMouseEvent.Type.MouseMove: label.mouseMoveEvent,
+            QMouseEvent.Type.MouseButtonRelease: label.mouseReleaseEvent,
+        }[event_type]
+        handler(
+            QMouseEvent(
+                event_type,
+                pos,
+                Qt.LeftButton,  # type: ignore # noqa
+                Qt.LeftButton,  # type: ignore # noqa
+                Qt.NoModifier,  # type: ignore # noqa
+            )
+        )
+
+    annotation = main_window.annotations()[0]
+    scale = 1 / label.zoom
+    assert abs(annotation.x - 100 * scale) <= 1
+    assert abs(annotation.y - 100 * scale) <= 1
+    assert abs(annotation.width - 100 * scale) <= 1
+    assert abs(annotation.height - 50 * scale) <= 1
+    # Painting only converts the 3 x 2 tiles covering the visible
+    # 1170 x 750 image pixels, out of 8 x 6
+    label.grab()
+    assert len(label.pyramid._tiles) == 6  # type: ignore # noqa
+
+    main_window.save_images()
+    main_window.wait_for_save()
+    cropped = cv2.imread(str(tmp_path / "bbox_1.png"))
+    np.testing.assert_array_equal(
+        cropped,
+        pixels[
+            annotation.y : annotation.y + annotation.height,
+            annotation.x : annotation.x + annotation.width,
+        ],
+    )
@@ -0,0 +1,89 @@
+"""Test annotations and batch_crop."""
+
+import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+from annotations import BoxAnnotation, read_annotations, write_annotations
+from batch_crop import batch_crop
+
+
+@pytest.fixture
+def annotated_image(tmp_path: Path) -> np.ndarray:
+    """Write a random image and an annotation file next to it."""
+    image = np.random.default_rng(0).integers(
+        0, 256, (120, 160, 3), dtype=np.uint8
+    )
+    cv2.imwrite(str(tmp_path / "study.png"), image)
+    write_annotations(
+        str(tmp_path / "boxes.csv"),
+        [BoxAnnotation("study.png", "item1", 10, 20, 30, 40)],
+    )
+    # Appended rows: one box crossing the border and one outside the image
+    write_annotations(
+        str(tmp_path / "boxes.csv"),
+        [
+            BoxAnnotation("study.png", "item2", 150, 100, 50, 50),
+            BoxAnnotation("study.png", "item3", 500, 500, 10, 10),
+        ],
+    )
+    return image
+
+
+def test_read_annotations(annotated_image: np.ndarray, tmp_path: Path) -> None:
+    """Test appended rows are read back with resolved image paths."""
+    annotations = read_annotations(str(tmp_path / "boxes.csv"))
+
+    assert [annotation.name for annotation in annotations] == [
+        "item1",
+        "item2",
+        "item3",
+    ]
+    assert annotations[0].image == str(tmp_path / "study.png")
+    assert annotations[1][2:] == (150, 100, 50, 50)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_crop(
+    annotated_image: np.ndarray, tmp_path: Path, workers: int
+) -> None:
+    """Test crops match NumPy slices of the source image."""
+    output_dir = str(tmp_path / "slices")
+
+    count, errors = batch_crop(
+        [str(tmp_path / "boxes.csv")], output_dir, workers
+    )
+
+    assert count == 2
+    assert len(errors) == 1 and "item3" in errors[0]
+    folder = os.path.join(output_dir, "study")
+    assert sorted(os.listdir(folder)) == ["bbox_1.png", "bbox_2.png"]
+    np.testing.assert_array_equal(
+        cv2.imread(os.path.join(folder, "bbox_1.png")),
+        annotated_image[20:60, 10:40],
+    )
+    # Boxes crossing the border are clipped
+    np.testing.assert_array_equal(
+        cv2.imread(os.path.join(folder, "bbox_2.png")),
+        annotated_image[100:120, 150:160],
+    )
+
+
+def test_batch_crop_write_error(
+    annotated_image: np.ndarray, tmp_path: Path
+) -> None:
+    """Test a crop that cannot be written is reported, not counted."""
+    folder = tmp_path / "slices" / "study"
+    # A folder in place of the first crop makes its write fail
+    (folder / "bbox_1.png").mkdir(parents=True)
+
+    count, errors = batch_crop(
+        [str(tmp_path / "boxes.csv")], str(tmp_path / "slices"), 1
+    )
+
+    assert count == 1
+    assert len(errors) == 2
+    assert "item1" in errors[0] and "cannot write" in errors[0]
+    assert (folder / "bbox_2.png").is_file()
@@ -1,9 +1,18 @@
 """Test property_calculation."""
 
+from pathlib import Path
+
+import cv2
 import numpy as np
 from property_calculation import (
+    FeatureBuffers,
+    block_average,
+    compute_feature_vector,
+    compute_feature_vector_fast,
     compute_similarity,
     extract_image_features,
+    extract_raw_features,
+    iter_raw_features,
     plot_heatmap,
 )
 
@@ -25,6 +34,42 @@ def test_extract_image_features() -> None:
         assert all(isinstance(f, float) for f in feature_vector)
 
 
+# Test the fused feature kernel against the reference implementation
+def test_compute_feature_vector_fast() -> None:
+    """Test the fast kernel matches the reference within tolerance."""
+    rng = np.random.default_rng(0)
+    images = [
+        cv2.imread("slices_from_GUI/bbox_1.png"),
+        rng.integers(0, 256, (37, 53, 3), dtype=np.uint8),
+        np.full((20, 20, 3), 128, dtype=np.uint8),
+        # Non-contiguous view into a larger image
+        rng.integers(0, 256, (300, 400, 3), dtype=np.uint8)[50:250, 7:333],
+    ]
+    buffers = FeatureBuffers()
+    for image in images:
+        np.testing.assert_allclose(
+            compute_feature_vector_fast(image, buffers),
+            compute_feature_vector(image),
+            rtol=1e-9,
+            atol=1e-9,
+        )
+
+
+# Test the streaming iter_raw_features generator
+def test_iter_raw_features() -> None:
+    """Test streamed raw features match the batch extraction."""
+    folder_path = "slices_from_GUI"
+    expected = extract_raw_features(folder_path)
+
+    stream = iter_raw_features(folder_path, workers=2, chunk_size=3)
+    filename, feature_vector = next(stream)
+    streamed = {filename: feature_vector, **dict(stream)}
+
+    assert list(streamed) == list(expected)
+    for filename, feature_vector in expected.items():
+        np.testing.assert_array_equal(streamed[filename], feature_vector)
+
+
 # Test compute_similarity function
 def test_compute_similarity() -> None:
     """Test similarity calculation."""
@@ -56,3 +101,49 @@ def test_plot_heatmap() -> None:
 
     # Call plot_heatmap without raising any errors
     plot_heatmap(random_similarity_matrix, filenames, "tests")
+
+
+# Test repeated plots, e.g. in watch mode, do not leak figures
+def test_plot_heatmap_closes_figures(tmp_path: Path) -> None:
+    """Test every heatmap figure is closed once saved."""
+    import matplotlib.pyplot as plt
+
+    open_figures = plt.get_fignums()
+    for _ in range(3):
+        plot_heatmap(np.eye(3), ["a.png", "b.png", "c.png"], str(tmp_path))
+    assert plt.get_fignums() == open_figures
+
+
+# Test the process pool path of extract_image_features
+def test_extract_image_features_parallel() -> None:
+    """Test parallel extraction matches the serial result."""
+    folder_path = "slices_from_GUI"
+    serial = extract_image_features(folder_path)
+    parallel = extract_image_features(folder_path, workers=2)
+
+    # Same filenames in the same order, with the same values
+    assert list(parallel) == list(serial)
+    for filename, feature_vector in serial.items():
+        assert parallel[filename] == feature_vector
+
+
+# Test the large-N heatmap path
+def test_plot_heatmap_large(tmp_path: Path) -> None:
+    """Test block averaging and rendering of a large memory mapped matrix."""
+    n = 1200
+    similarity_matrix = np.lib.format.open_memmap(
+        str(tmp_path / "similarity.npy"), mode="w+", shape=(n, n)
+    )
+    similarity_matrix[:] = np.random.default_rng(0).random((n, n))
+    filenames = [f"bbox_{i + 1}.png" for i in range(n)]
+
+    reduced, edges = block_average(similarity_matrix, 300)
+    assert reduced.shape == (300, 300)
+    np.testing.assert_allclose(
+        reduced, similarity_matrix.reshape(300, 4, 300, 4).mean(axis=(1, 3))
+    )
+    assert edges[0] == 0 and edges[-1] == n
+
+    # plot_heatmap switches to the large renderer on its own
+    plot_heatmap(similarity_matrix, filenames, str(tmp_path))
+    assert (tmp_path / "similarity_heatmap.png").exists()
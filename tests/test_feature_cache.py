@@ -0,0 +1,85 @@
+"""Test feature_cache."""
+
+import os
+import shutil
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import property_calculation
+import pytest
+from feature_cache import FeatureCache
+from profiling import PipelineStats
+from property_calculation import FEATURE_VERSION, extract_image_features
+
+
+@pytest.fixture
+def slice_folder(tmp_path: Path) -> str:
+    """Copy the sample slices into a scratch folder."""
+    folder = tmp_path / "slices"
+    shutil.copytree("slices_from_GUI", folder)
+    return str(folder)
+
+
+def test_cached_features_match_uncached(
+    slice_folder: str, tmp_path: Path
+) -> None:
+    """Test a cold and a warm cached run give the uncached result."""
+    cache_path = str(tmp_path / "features.npz")
+    expected = extract_image_features(slice_folder)
+
+    cold = extract_image_features(slice_folder, cache_path=cache_path)
+    assert os.path.exists(cache_path)
+    warm = extract_image_features(slice_folder, cache_path=cache_path)
+
+    assert cold == expected
+    assert warm == expected
+
+
+def test_cache_only_decodes_changed_files(
+    slice_folder: str, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test a warm run only reads new images and evicts deleted ones."""
+    cache_path = str(tmp_path / "features.npz")
+    extract_image_features(slice_folder, cache_path=cache_path)
+
+    # Add one image and remove another
+    shutil.copy(
+        os.path.join(slice_folder, "bbox_1.png"),
+        os.path.join(slice_folder, "bbox_11.png"),
+    )
+    os.remove(os.path.join(slice_folder, "bbox_2.png"))
+
+    read_paths = []
+    read_feature_vector = property_calculation.read_feature_vector
+
+    def counting_read(
+        path: str, stats: Optional[PipelineStats] = None
+    ) -> Optional[np.ndarray]:
+        read_paths.append(path)
+        return read_feature_vector(path, stats)
+
+    monkeypatch.setattr(
+        property_calculation, "read_feature_vector", counting_read
+    )
+    feature_dict = extract_image_features(slice_folder, cache_path=cache_path)
+
+    assert [os.path.basename(path) for path in read_paths] == ["bbox_11.png"]
+    assert "bbox_2.png" not in feature_dict
+    cache = FeatureCache(cache_path, FEATURE_VERSION)
+    assert len(cache) == len(feature_dict)
+
+
+def test_cache_dropped_on_version_change(tmp_path: Path) -> None:
+    """Test vectors written by another feature version are ignored."""
+    cache_path = str(tmp_path / "features.npz")
+    image_path = str(tmp_path / "image.png")
+    Path(image_path).write_bytes(b"")
+    stat = os.stat(image_path)
+
+    cache = FeatureCache(cache_path, "old")
+    cache.put(image_path, stat, np.arange(14.0))
+    cache.save()
+
+    assert FeatureCache(cache_path, "old").get(image_path, stat) is not None
+    assert FeatureCache(cache_path, "new").get(image_path, stat) is None
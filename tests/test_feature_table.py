@@ -0,0 +1,44 @@
+"""Test feature_table."""
+
+import numpy as np
+import pytest
+from feature_table import FeatureTable
+from property_calculation import (
+    compute_similarity,
+    extract_feature_table,
+    extract_image_features,
+)
+
+
+def test_feature_table_matches_feature_dict() -> None:
+    """Test the table is a view of the extract_image_features output."""
+    folder_path = "slices_from_GUI"
+    feature_dict = extract_image_features(folder_path)
+    feature_table = extract_feature_table(folder_path)
+
+    assert feature_table.matrix.flags["C_CONTIGUOUS"]
+    assert feature_table.matrix.shape == (len(feature_dict), 14)
+    assert list(feature_table) == list(feature_dict)
+    assert dict(feature_table) == feature_dict
+    assert feature_table.to_dict() == feature_dict
+
+    np.testing.assert_array_equal(
+        compute_similarity(feature_table), compute_similarity(feature_dict)
+    )
+
+
+def test_feature_table_mapping_api() -> None:
+    """Test lookups, views and validation of a small table."""
+    matrix = np.arange(6, dtype=np.float32).reshape(3, 2)
+    feature_table = FeatureTable(["a.png", "b.png", "c.png"], matrix)
+
+    assert feature_table.matrix is matrix
+    assert feature_table["b.png"] == [2.0, 3.0]
+    assert feature_table.index("c.png") == 2
+    assert np.shares_memory(feature_table.row("a.png"), matrix)
+    assert "d.png" not in feature_table
+    assert FeatureTable.from_dict(feature_table) is feature_table
+    empty = FeatureTable.from_dict({})
+    assert len(empty) == 0 and empty.matrix.shape == (0, 0)
+    with pytest.raises(ValueError):
+        FeatureTable(["a.png"], matrix)
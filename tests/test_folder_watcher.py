@@ -0,0 +1,82 @@
+"""Test folder_watcher."""
+
+import os
+from pathlib import Path
+from typing import Callable, List
+
+import numpy as np
+from folder_watcher import FolderWatcher
+from image_cache import default_cache
+from property_calculation import compute_similarity, extract_feature_table
+
+
+def _expected(folder: Path, filenames: list) -> np.ndarray:
+    """Return compute_similarity of the folder in the given order."""
+    feature_table = extract_feature_table(str(folder))
+    order = [feature_table.index(name) for name in filenames]
+    return compute_similarity(feature_table)[np.ix_(order, order)]
+
+
+def test_exact_updates(
+    tmp_path: Path, write_images: Callable[..., List[str]]
+) -> None:
+    """Test added, changed and removed files without drift tolerance."""
+    write_images([f"bbox_{i}.png" for i in range(1, 6)])
+    watcher = FolderWatcher(str(tmp_path), drift_tolerance=0.0)
+
+    assert watcher.poll()
+    assert not watcher.poll()
+    np.testing.assert_allclose(
+        watcher.similarity, _expected(tmp_path, watcher.filenames)
+    )
+
+    write_images(["bbox_6.png", "bbox_2.png"], seed=1)
+    os.remove(tmp_path / "bbox_1.png")
+    # Make sure the rewritten file has a new modification time
+    os.utime(tmp_path / "bbox_2.png", ns=(0, 0))
+    assert watcher.poll()
+
+    assert sorted(watcher.filenames) == [f"bbox_{i}.png" for i in range(2, 7)]
+    np.testing.assert_allclose(
+        watcher.similarity, _expected(tmp_path, watcher.filenames)
+    )
+
+
+def test_incremental_rows(
+    tmp_path: Path, write_images: Callable[..., List[str]]
+) -> None:
+    """Test rows patched with frozen statistics and ignored files."""
+    write_images([f"bbox_{i}.png" for i in range(1, 41)])
+    write_images(["other.png"])
+    (tmp_path / "bbox_41.png").write_bytes(b"partially written")
+    watcher = FolderWatcher(
+        str(tmp_path), pattern="bbox_*.png", drift_tolerance=10.0
+    )
+    watcher.poll()
+    mean = watcher._mean
+
+    write_images(["bbox_41.png", "bbox_42.png"], seed=1)
+    os.remove(tmp_path / "bbox_3.png")
+    assert watcher.poll()
+
+    # No refresh, the new rows use the statistics of the first poll
+    assert watcher._mean is mean
+    assert len(watcher) == 41
+    assert "other.png" not in watcher.filenames
+    vectors = watcher.feature_table().matrix
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.testing.assert_allclose(watcher.similarity, vectors @ vectors.T)
+
+
+def test_poll_skips_shared_cache(
+    tmp_path: Path, write_images: Callable[..., List[str]]
+) -> None:
+    """Test polled files are not kept in the shared image cache."""
+    write_images([f"bbox_{i}.png" for i in range(1, 4)])
+    default_cache.clear()
+    watcher = FolderWatcher(str(tmp_path))
+
+    assert watcher.poll()
+
+    assert len(watcher) == 3
+    assert len(default_cache) == 0
@@ -0,0 +1,69 @@
+"""Test image_cache."""
+
+import os
+from pathlib import Path
+from typing import Callable, List
+
+import cv2
+import numpy as np
+import pytest
+from image_cache import ImageCache
+from property_calculation import compute_feature_vector, read_feature_vector
+
+
+def test_hits_and_eviction(write_images: Callable[..., List[str]]) -> None:
+    """Test repeated reads hit and the budget evicts the oldest entry."""
+    paths = write_images(["slice_0.png", "slice_1.png", "slice_2.png"])
+    # Room for two 32 x 32 x 3 images
+    cache = ImageCache(max_bytes=2 * 32 * 32 * 3)
+
+    first = cache.imread(paths[0])
+    assert first is not None
+    np.testing.assert_array_equal(first, cv2.imread(paths[0]))
+    assert cache.imread(paths[0]) is first
+    assert not first.flags.writeable
+    cache.imread(paths[1])
+    cache.imread(paths[2])
+
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 3,
+        "evictions": 1,
+        "entries": 2,
+        "bytes": 2 * 32 * 32 * 3,
+    }
+    assert cache.imread(paths[0]) is not first
+    assert cache.misses == 4
+
+
+def test_changed_and_missing_files(
+    tmp_path: Path, write_images: Callable[..., List[str]]
+) -> None:
+    """Test rewritten files are decoded again and missing ones give None."""
+    paths = write_images(["slice_0.png"])
+    cache = ImageCache()
+    first = cache.imread(paths[0])
+    cv2.imwrite(paths[0], np.zeros((8, 8, 3), dtype=np.uint8))
+    os.utime(paths[0], ns=(0, 0))
+
+    second = cache.imread(paths[0])
+
+    assert second is not None and second.shape == (8, 8, 3)
+    assert second is not first
+    assert cache.imread(str(tmp_path / "missing.png")) is None
+    cache.resize(0)
+    assert len(cache) == 0 and cache.current_bytes == 0
+
+
+@pytest.mark.parametrize("repeat", [1, 2])
+def test_read_feature_vector_cached(
+    write_images: Callable[..., List[str]], repeat: int
+) -> None:
+    """Test cached, read-only images give the same features."""
+    (path,) = write_images(["slice_0.png"])
+    for _ in range(repeat):
+        feature_vector = read_feature_vector(path)
+    assert feature_vector is not None
+    np.testing.assert_allclose(
+        feature_vector, compute_feature_vector(cv2.imread(path)), rtol=1e-9
+    )
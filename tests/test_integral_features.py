@@ -0,0 +1,65 @@
+"""Test integral_features."""
+
+import cv2
+import numpy as np
+from annotations import BoxAnnotation
+from integral_features import IntegralFeatureEngine
+from property_calculation import compute_feature_vector
+
+
+def _image() -> np.ndarray:
+    """Return a smooth random test image with some edges."""
+    image = np.random.default_rng(0).integers(
+        0, 256, (240, 320, 3), dtype=np.uint8
+    )
+    image = cv2.GaussianBlur(image, (5, 5), 0)
+    cv2.rectangle(image, (40, 30), (200, 150), (20, 200, 90), -1)
+    return image
+
+
+def test_whole_image_box_matches_reference() -> None:
+    """Test a box covering the image reproduces compute_feature_vector."""
+    image = _image()
+    engine = IntegralFeatureEngine(image)
+
+    raw_features = engine.raw_features(
+        [BoxAnnotation("", "item1", 0, 0, 320, 240)]
+    )
+
+    np.testing.assert_allclose(
+        raw_features[0], compute_feature_vector(image), rtol=1e-9
+    )
+
+
+def test_box_features_match_crops() -> None:
+    """Test colour features of boxes against cropped images."""
+    image = _image()
+    boxes = [
+        BoxAnnotation("", "item1", 10, 20, 50, 40),
+        BoxAnnotation("", "item2", 30, 25, 200, 100),
+        BoxAnnotation("", "item3", 300, 200, 50, 50),  # Crosses the border
+        BoxAnnotation("", "item4", 400, 400, 10, 10),  # Outside the image
+    ]
+    engine = IntegralFeatureEngine(image)
+
+    features = dict(engine.iter_box_features(boxes))
+
+    assert list(features) == ["bbox_1.png", "bbox_2.png", "bbox_3.png"]
+    crops = [
+        image[20:60, 10:60],
+        image[25:125, 30:230],
+        image[200:240, 300:320],
+    ]
+    edges = cv2.Canny(image, 100, 200)
+    for feature_vector, cropped, (top, left) in zip(
+        features.values(), crops, [(20, 10), (25, 30), (200, 300)], strict=True
+    ):
+        expected = compute_feature_vector(cropped)
+        np.testing.assert_allclose(
+            feature_vector[:12], expected[:12], rtol=1e-9
+        )
+        # Edges come from the full image edge map
+        height, width = cropped.shape[:2]
+        assert feature_vector[12] == np.mean(
+            edges[top : top + height, left : left + width]
+        )
@@ -0,0 +1,46 @@
+"""Test normalization."""
+
+import numpy as np
+from normalization import IncrementalNormalizer
+from property_calculation import extract_image_features, extract_raw_features
+
+
+def test_normalizer_matches_batch_zscore() -> None:
+    """Test running statistics reproduce extract_image_features."""
+    folder_path = "slices_from_GUI"
+    normalizer = IncrementalNormalizer(extract_raw_features(folder_path))
+    expected = extract_image_features(folder_path)
+
+    feature_dict = normalizer.normalized()
+    assert list(feature_dict) == list(expected)
+    np.testing.assert_allclose(
+        np.array(list(feature_dict.values())),
+        np.array(list(expected.values())),
+        rtol=1e-9,
+        atol=1e-9,
+    )
+
+
+def test_normalizer_add_remove_replace() -> None:
+    """Test statistics follow additions, removals and replacements."""
+    rng = np.random.default_rng(0)
+    vectors = {f"bbox_{i}.png": rng.normal(size=14) * 50 for i in range(20)}
+    normalizer = IncrementalNormalizer(vectors)
+
+    # Drop a few images and replace one with a new vector
+    for name in ["bbox_0.png", "bbox_7.png", "bbox_13.png"]:
+        normalizer.remove(name)
+        del vectors[name]
+    vectors["bbox_4.png"] = rng.normal(size=14)
+    normalizer.add("bbox_4.png", vectors["bbox_4.png"])
+
+    all_features_array = np.array(list(vectors.values()))
+    assert len(normalizer) == len(vectors)
+    np.testing.assert_allclose(
+        normalizer.mean, all_features_array.mean(axis=0), atol=1e-9
+    )
+    np.testing.assert_allclose(
+        normalizer.std, all_features_array.std(axis=0), atol=1e-9
+    )
+    # The replaced image keeps its position
+    assert list(normalizer.normalized()) == list(vectors)
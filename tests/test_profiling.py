@@ -0,0 +1,69 @@
+"""Test profiling."""
+
+import json
+from pathlib import Path
+from typing import Callable, List
+
+import numpy as np
+from profiling import PipelineStats, stage
+from property_calculation import (
+    compute_similarity,
+    extract_feature_table,
+    extract_image_features,
+)
+
+
+def test_pipeline_stages(
+    tmp_path: Path, write_images: Callable[..., List[str]]
+) -> None:
+    """Test a profiled run records every stage without changing results."""
+    write_images([f"slice_{i}.png" for i in range(4)])
+    finished = []
+    stats = PipelineStats(callback=lambda name, _: finished.append(name))
+
+    feature_table = extract_feature_table(str(tmp_path), stats=stats)
+    similarity_matrix = compute_similarity(feature_table, stats)
+
+    np.testing.assert_array_equal(
+        feature_table.matrix,
+        np.array(list(extract_image_features(str(tmp_path)).values())),
+    )
+    assert similarity_matrix.shape == (4, 4)
+    for name in ["extract.decode", "extract.color", "extract.canny"]:
+        assert stats.stages[name]["calls"] == 4
+        assert stats.stages[name]["items"] == 4
+    assert stats.stages["extract.decode"]["bytes_read"] == sum(
+        path.stat().st_size for path in tmp_path.iterdir()
+    )
+    # A second run decodes through the image cache without reading files
+    cached_stats = PipelineStats()
+    extract_feature_table(str(tmp_path), stats=cached_stats)
+    assert cached_stats.stages["extract.decode"]["items"] == 4
+    assert cached_stats.stages["extract.decode"]["bytes_read"] == 0
+    assert stats.stages["extract"]["calls"] == 1
+    assert stats.stages["normalize"]["items"] == 4
+    assert stats.stages["similarity"]["items"] == 4
+    assert stats.counters == {"images": 4}
+    assert finished[-1] == "similarity"
+
+    report_path = tmp_path / "report.json"
+    stats.dump(str(report_path))
+    report = json.loads(report_path.read_text())
+    assert set(report) == {"stages", "counters", "peak_rss_bytes"}
+    assert report["stages"]["extract"]["seconds"] >= 0
+
+
+def test_track_allocations() -> None:
+    """Test the peak traced allocation of a stage is recorded."""
+    stats = PipelineStats(track_allocations=True)
+    with stats.stage("allocate"):
+        block = np.ones(1 << 20, dtype=np.uint8)
+    del block
+    assert stats.stages["allocate"]["peak_allocated_bytes"] >= 1 << 20
+
+
+def test_disabled_stage() -> None:
+    """Test profiling off shares one no-op context manager."""
+    assert stage(None, "extract") is stage(None, "similarity")
+    with stage(None, "extract"):
+        pass
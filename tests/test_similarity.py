@@ -0,0 +1,153 @@
+"""Test similarity."""
+
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pytest
+from feature_table import FeatureTable
+from property_calculation import compute_similarity
+from similarity import (
+    blocked_similarity,
+    condensed_similarity,
+    top_k_similar,
+    top_k_similar_to,
+)
+
+
+def _random_features(n: int = 50) -> np.ndarray:
+    """Return reproducible random Z-score like feature vectors."""
+    return np.random.default_rng(0).normal(size=(n, 14))
+
+
+def test_blocked_similarity_matches_dense() -> None:
+    """Test blocks that do not divide N reproduce compute_similarity."""
+    feature_vectors = _random_features()
+    feature_dict = {
+        f"bbox_{i}.png": list(vector)
+        for i, vector in enumerate(feature_vectors)
+    }
+    expected = compute_similarity(feature_dict)
+
+    similarity_matrix = blocked_similarity(feature_dict, block_size=7)
+    assert similarity_matrix is not None
+    np.testing.assert_allclose(similarity_matrix, expected, atol=1e-12)
+
+
+def test_blocked_similarity_memmap_output(tmp_path: Path) -> None:
+    """Test blocks written to a float32 .npy memory map."""
+    feature_vectors = _random_features()
+    out = str(tmp_path / "similarity.npy")
+
+    blocked_similarity(
+        feature_vectors, block_size=16, dtype=np.float32, out=out
+    )
+    similarity_matrix = np.load(out, mmap_mode="r")
+
+    assert similarity_matrix.dtype == np.float32
+    assert similarity_matrix.shape == (50, 50)
+    expected = blocked_similarity(feature_vectors)
+    np.testing.assert_allclose(similarity_matrix, expected, atol=1e-5)
+
+
+def test_blocked_similarity_callback() -> None:
+    """Test blocks are streamed in order without a returned matrix."""
+    starts: List[int] = []
+    rows: List[np.ndarray] = []
+
+    def collect(start: int, block: np.ndarray) -> None:
+        starts.append(start)
+        rows.append(block.copy())
+
+    result = blocked_similarity(
+        _random_features(), block_size=20, callback=collect
+    )
+
+    assert result is None
+    assert starts == [0, 20, 40]
+    assert np.vstack(rows).shape == (50, 50)
+
+
+def test_top_k_similar_matches_full_matrix() -> None:
+    """Test blocked top-k neighbours against a sorted dense matrix."""
+    feature_vectors = _random_features()
+    similarity_matrix = blocked_similarity(feature_vectors)
+    assert similarity_matrix is not None
+    np.fill_diagonal(similarity_matrix, -np.inf)
+
+    indices, scores = top_k_similar(feature_vectors, k=5, block_size=8)
+
+    assert indices.shape == scores.shape == (50, 5)
+    expected = np.sort(similarity_matrix, axis=1)[:, ::-1][:, :5]
+    np.testing.assert_allclose(scores, expected, atol=1e-12)
+    np.testing.assert_allclose(
+        np.take_along_axis(similarity_matrix, indices, axis=1), scores
+    )
+    # A vector is never its own neighbour
+    assert not np.any(indices == np.arange(50)[:, np.newaxis])
+
+
+def test_top_k_similar_to_query() -> None:
+    """Test a single query finds itself first and ranks the rest."""
+    feature_vectors = _random_features()
+    query_vector = feature_vectors[17]
+
+    indices, scores = top_k_similar_to(
+        feature_vectors, query_vector, k=4, block_size=9
+    )
+
+    assert indices[0] == 17
+    assert scores[0] == pytest.approx(1.0)
+    assert np.all(np.diff(scores) <= 0)
+    similarity_matrix = blocked_similarity(feature_vectors)
+    assert similarity_matrix is not None
+    np.testing.assert_array_equal(
+        indices, np.argsort(-similarity_matrix[17], kind="stable")[:4]
+    )
+
+
+def _reference_similarity(feature_vectors: np.ndarray) -> np.ndarray:
+    """Return the dot products divided by both norms, in float64."""
+    norm = np.linalg.norm(feature_vectors, axis=1)
+    return (feature_vectors @ feature_vectors.T) / np.outer(norm, norm)
+
+
+@pytest.mark.parametrize(
+    ("dtype", "atol"), [(np.float64, 1e-12), (np.float32, 1e-5)]
+)
+def test_compute_similarity_precision(dtype: type, atol: float) -> None:
+    """Test both precisions stay within the documented tolerance."""
+    feature_vectors = _random_features(200)
+    feature_table = FeatureTable(
+        [f"bbox_{i}.png" for i in range(200)], feature_vectors
+    )
+
+    similarity_matrix = compute_similarity(feature_table, dtype=dtype)
+
+    assert similarity_matrix.dtype == dtype
+    np.testing.assert_allclose(
+        similarity_matrix, _reference_similarity(feature_vectors), atol=atol
+    )
+    # A float32 table keeps its precision by default
+    float32_table = FeatureTable(
+        feature_table.filenames, feature_vectors.astype(np.float32)
+    )
+    assert compute_similarity(float32_table).dtype == np.float32
+
+
+def test_condensed_similarity_upper_triangle() -> None:
+    """Test blocks that do not divide N fill the condensed triangle."""
+    feature_vectors = _random_features(50)
+    expected = _reference_similarity(feature_vectors)[np.triu_indices(50, 1)]
+
+    condensed = condensed_similarity(feature_vectors, block_size=7)
+
+    assert condensed.shape == (50 * 49 // 2,)
+    np.testing.assert_allclose(condensed, expected, atol=1e-12)
+    feature_dict = {str(i): list(v) for i, v in enumerate(feature_vectors)}
+    np.testing.assert_allclose(
+        compute_similarity(feature_dict, dtype=np.float32, condensed=True),
+        expected,
+        atol=1e-5,
+    )
+    assert condensed_similarity(feature_vectors[:1]).shape == (0,)
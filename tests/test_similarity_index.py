@@ -0,0 +1,107 @@
+"""Test similarity_index."""
+
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+from property_calculation import extract_image_features
+from similarity import top_k_similar
+from similarity_index import SimilarityIndex
+
+
+def test_index_query_matches_top_k(tmp_path: Path) -> None:
+    """Test a reopened index ranks slices like top_k_similar."""
+    folder_path = "slices_from_GUI"
+    index_path = str(tmp_path / "index")
+    SimilarityIndex.from_folder(index_path, folder_path)
+
+    index = SimilarityIndex(index_path)
+    feature_dict = extract_image_features(folder_path)
+    filenames = list(feature_dict)
+    assert len(index) == len(feature_dict)
+    assert index.names == filenames
+
+    results = index.query_image(os.path.join(folder_path, "bbox_3.png"), k=4)
+
+    # The image itself comes first, followed by its nearest neighbours
+    assert results[0][0] == "bbox_3.png"
+    assert results[0][1] == pytest.approx(1.0, abs=1e-5)
+    indices, scores = top_k_similar(feature_dict, k=3)
+    row = filenames.index("bbox_3.png")
+    assert [name for name, _ in results[1:]] == [
+        filenames[i] for i in indices[row]
+    ]
+    np.testing.assert_allclose(
+        [score for _, score in results[1:]], scores[row], atol=1e-5
+    )
+
+
+def test_index_append(tmp_path: Path) -> None:
+    """Test appended slices are persisted and searchable."""
+    folder_path = "slices_from_GUI"
+    index_path = str(tmp_path / "index")
+    index = SimilarityIndex.from_folder(index_path, folder_path)
+    n = len(index)
+
+    skipped = index.add_images(
+        [os.path.join("tests", "test_save", "bbox_2.png"), "missing.png"]
+    )
+
+    assert skipped == ["missing.png"]
+    reopened = SimilarityIndex(index_path)
+    assert len(reopened) == n + 1
+    assert reopened.names[-1] == "bbox_2.png"
+    assert reopened.vectors.dtype == np.float32
+    np.testing.assert_allclose(
+        np.linalg.norm(reopened.vectors, axis=1), 1.0, atol=1e-5
+    )
+
+
+def test_interrupted_append(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test rows of a failed append are never visible and are replaced."""
+    folder_path = "slices_from_GUI"
+    index_path = str(tmp_path / "index")
+    index = SimilarityIndex.from_folder(index_path, folder_path)
+    n = len(index)
+    new_image = os.path.join("tests", "test_save", "bbox_2.png")
+
+    def crash(*args: object) -> None:
+        raise OSError("disk full")
+
+    # Both data files are written, the commit fails
+    monkeypatch.setattr(SimilarityIndex, "_write_meta", crash)
+    with pytest.raises(OSError):
+        index.add_images([new_image])
+    monkeypatch.undo()
+
+    reopened = SimilarityIndex(index_path)
+    assert len(reopened) == len(reopened.names) == len(reopened.vectors) == n
+    assert reopened.query_image(new_image, k=n + 5)
+
+    reopened.add_images([new_image])
+    reopened = SimilarityIndex(index_path)
+    assert len(reopened) == len(reopened.names) == len(reopened.vectors)
+    assert reopened.names[n:] == ["bbox_2.png"]
+    assert (tmp_path / "index" / "vectors.f32").stat().st_size == (
+        (n + 1) * reopened.dim * 4
+    )
+
+
+def test_appends_from_two_handles(tmp_path: Path) -> None:
+    """Test a handle keeps the rows another handle committed."""
+    index_path = str(tmp_path / "index")
+    first = SimilarityIndex.from_folder(index_path, "slices_from_GUI")
+    second = SimilarityIndex(index_path)
+    n = len(first)
+    assert first.names
+
+    first.add_images([os.path.join("tests", "test_save", "bbox_1.png")])
+    second.add_images([os.path.join("tests", "test_save", "bbox_2.png")])
+
+    reopened = SimilarityIndex(index_path)
+    assert len(reopened) == len(reopened.vectors) == n + 2
+    assert reopened.names[n:] == ["bbox_1.png", "bbox_2.png"]
+    assert second.names == reopened.names
@@ -0,0 +1,103 @@
+"""Test slice_pack."""
+
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+from property_calculation import extract_feature_table, extract_raw_features
+from slice_pack import (
+    ALIGNMENT,
+    SlicePack,
+    is_slice_pack,
+    pack_folder,
+    write_pack,
+)
+
+
+def test_round_trip(tmp_path: Path) -> None:
+    """Test slices come back as aligned read-only views."""
+    rng = np.random.default_rng(0)
+    slices = {
+        "a.png": rng.integers(0, 256, (7, 5, 3), dtype=np.uint8),
+        "b.png": rng.integers(0, 256, (3, 9), dtype=np.uint8),
+        "c.png": rng.integers(0, 256, (40, 30, 3), dtype=np.uint8)[::2],
+    }
+    path = str(tmp_path / "study.slicepack")
+
+    assert write_pack(path, slices.items()) == 3
+    pack = SlicePack(path)
+
+    assert is_slice_pack(path)
+    assert list(pack) == list(slices)
+    for name, image in slices.items():
+        np.testing.assert_array_equal(pack[name], image)
+        assert not pack[name].flags.writeable
+        assert pack[name].ctypes.data % ALIGNMENT == 0
+
+
+def test_invalid_packs(tmp_path: Path) -> None:
+    """Test rejected names, dtypes and files."""
+    path = str(tmp_path / "study.slicepack")
+    image = np.zeros((2, 2, 3), dtype=np.uint8)
+    with pytest.raises(ValueError, match="Duplicate"):
+        write_pack(path, [("a", image), ("a", image)])
+    with pytest.raises(ValueError, match="uint8"):
+        write_pack(path, [("a", image.astype(np.float32))])
+    # Failed writes leave nothing behind
+    assert list(tmp_path.iterdir()) == []
+
+    (tmp_path / "image.png").write_bytes(b"not a pack")
+    assert not is_slice_pack(str(tmp_path / "image.png"))
+    with pytest.raises(ValueError, match="not a slice pack"):
+        SlicePack(str(tmp_path / "image.png"))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_extract_from_pack(tmp_path: Path, workers: int) -> None:
+    """Test a packed folder gives the same features as the PNG files."""
+    folder = tmp_path / "slices"
+    folder.mkdir()
+    rng = np.random.default_rng(1)
+    for i in range(1, 8):
+        cv2.imwrite(
+            str(folder / f"bbox_{i}.png"),
+            rng.integers(0, 256, (20 + i, 30, 3), dtype=np.uint8),
+        )
+    pack_path = str(tmp_path / "slices.slicepack")
+    assert pack_folder(str(folder), pack_path) == 7
+
+    expected = extract_feature_table(str(folder))
+    feature_table = extract_feature_table(pack_path, workers=workers)
+
+    assert feature_table.filenames == expected.filenames
+    np.testing.assert_allclose(feature_table.matrix, expected.matrix)
+
+    # Cached vectors are reused until the pack changes
+    cache_path = str(tmp_path / "cache.npz")
+    first = extract_raw_features(pack_path, workers, cache_path)
+    second = extract_raw_features(pack_path, workers, cache_path)
+    for name, raw_vector in first.items():
+        np.testing.assert_array_equal(second[name], raw_vector)
+
+
+def test_extract_grayscale_slices(tmp_path: Path) -> None:
+    """Test grayscale slices are featurized like the same PNG files."""
+    folder = tmp_path / "slices"
+    folder.mkdir()
+    rng = np.random.default_rng(2)
+    slices = {
+        "a.png": rng.integers(0, 256, (12, 10), dtype=np.uint8),
+        "b.png": rng.integers(0, 256, (9, 14), dtype=np.uint8),
+    }
+    for name, image in slices.items():
+        cv2.imwrite(str(folder / name), image)
+    pack_path = str(tmp_path / "gray.slicepack")
+    write_pack(pack_path, slices.items())
+
+    expected = extract_raw_features(str(folder))
+    raw_features = extract_raw_features(pack_path)
+
+    assert list(raw_features) == list(expected)
+    for name, raw_vector in raw_features.items():
+        np.testing.assert_allclose(raw_vector, expected[name])
@@ -0,0 +1,56 @@
+"""Test spatial_index."""
+
+import numpy as np
+from spatial_index import GridIndex
+
+
+def _brute_force(boxes, bounds):  # type: ignore # noqa
+    """Return the ids of the boxes intersecting bounds by a full scan."""
+    return [
+        item_id
+        for item_id, box in enumerate(boxes)
+        if box[0] <= bounds[2]
+        and bounds[0] <= box[2]
+        and box[1] <= bounds[3]
+        and bounds[1] <= box[3]
+    ]
+
+
+def test_queries_match_brute_force() -> None:
+    """Test point and rectangle queries against a linear scan."""
+    rng = np.random.default_rng(0)
+    corners = rng.integers(0, 1000, (500, 2))
+    sizes = rng.integers(0, 80, (500, 2))
+    boxes = [
+        (int(x), int(y), int(x + w), int(y + h))
+        for (x, y), (w, h) in zip(corners, sizes, strict=True)
+    ]
+    # One box spanning everything goes to the oversized list
+    boxes.append((0, 0, 2000, 2000))
+    index = GridIndex(cell_size=50)
+    index.rebuild(enumerate(boxes))
+
+    assert len(index) == 501
+    for x, y in rng.integers(0, 1100, (50, 2)):
+        assert index.query_point(int(x), int(y)) == _brute_force(
+            boxes, (x, y, x, y)
+        )
+    for x, y, w, h in rng.integers(0, 600, (50, 4)):
+        bounds = (int(x), int(y), int(x + w), int(y + h))
+        assert index.query_rect(bounds) == _brute_force(boxes, bounds)
+
+
+def test_insert_and_remove() -> None:
+    """Test moved and removed items are no longer found."""
+    index = GridIndex(cell_size=10)
+    index.insert(0, (0, 0, 5, 5))
+    index.insert(1, (20, 20, 30, 30))
+
+    assert index.query_point(3, 3) == [0]
+    index.insert(0, (100, 100, 110, 110))
+    assert index.query_point(3, 3) == []
+    assert index.query_point(105, 100) == [0]
+
+    index.remove(1)
+    assert 1 not in index
+    assert index.query_rect((0, 0, 200, 200)) == [0]
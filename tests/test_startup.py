@@ -0,0 +1,54 @@
+"""Test cold import time of the modules."""
+
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+
+# Generous bound on the cumulative import time, in seconds
+IMPORT_BUDGET = 1.0
+
+
+def _import_times(module: str) -> Dict[str, float]:
+    """Import module in a fresh interpreter with -X importtime.
+
+    Returns:
+    import_times (dict): Cumulative import time in seconds of every
+    module that was loaded, including nested imports.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": SRC},
+    )
+    import_times = {}
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        import_times[name.strip()] = int(cumulative) / 1e6
+    return import_times
+
+
+@pytest.mark.parametrize(
+    ("module", "heavy"),
+    [
+        ("property_calculation", ["cv2", "matplotlib", "seaborn"]),
+        ("similarity", ["cv2", "matplotlib", "seaborn"]),
+        ("SegmentationGUI", ["cv2", "matplotlib", "seaborn", "numpy"]),
+    ],
+)
+def test_import_time(module: str, heavy: List[str]) -> None:
+    """Test heavy dependencies are not loaded at import time."""
+    import_times = _import_times(module)
+
+    for dependency in heavy:
+        assert dependency not in import_times
+    assert import_times[module] < IMPORT_BUDGET
@@ -0,0 +1,71 @@
+"""Test tiled_image."""
+
+import numpy as np
+from PyQt5.QtCore import QRect
+from tiled_image import ImagePyramid, to_qimage
+
+
+def _to_array(image) -> np.ndarray:  # type: ignore # noqa
+    """Return the pixels of a BGR888 QImage."""
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    rows = np.frombuffer(bits, dtype=np.uint8).reshape(
+        image.height(), image.bytesPerLine()
+    )
+    # Copy, the QImage may be deleted after the call
+    return rows[:, : image.width() * 3].reshape(image.height(), -1, 3).copy()
+
+
+def test_pyramid_levels() -> None:
+    """Test every level halves the previous one down to one tile."""
+    image = np.zeros((1000, 1500, 3), dtype=np.uint8)
+
+    pyramid = ImagePyramid(image, tile_size=256)
+
+    assert [level.shape[:2] for level in pyramid.levels] == [
+        (1000, 1500),
+        (500, 750),
+        (250, 375),
+        (125, 188),
+    ]
+    assert pyramid.level_for_scale(2.0) == 0
+    assert pyramid.level_for_scale(0.5) == 1
+    assert pyramid.level_for_scale(0.3) == 1
+    assert pyramid.level_for_scale(0.001) == 3
+
+
+def test_visible_tiles() -> None:
+    """Test only the tiles of the visible area are converted."""
+    image = np.random.default_rng(0).integers(
+        0, 256, (600, 700, 3), dtype=np.uint8
+    )
+    pyramid = ImagePyramid(image, tile_size=256)
+
+    tiles = list(pyramid.visible_tiles(0, QRect(300, 10, 100, 100)))
+
+    assert [source_rect for source_rect, _ in tiles] == [
+        QRect(256, 0, 256, 256)
+    ]
+    np.testing.assert_array_equal(
+        _to_array(tiles[0][1]), image[0:256, 256:512]
+    )
+    # Border tiles are clipped to the image
+    tiles = list(pyramid.visible_tiles(1, QRect(0, 0, 700, 600)))
+    assert [source_rect for source_rect, _ in tiles] == [
+        QRect(0, 0, 512, 512),
+        QRect(512, 0, 188, 512),
+        QRect(0, 512, 512, 88),
+        QRect(512, 512, 188, 88),
+    ]
+    assert len(pyramid._tiles) == 5
+
+
+def test_to_qimage() -> None:
+    """Test arrays survive the conversion to QImage."""
+    image = np.random.default_rng(1).integers(
+        0, 256, (31, 17, 3), dtype=np.uint8
+    )
+
+    np.testing.assert_array_equal(
+        _to_array(to_qimage(image[:, 3:])), image[:, 3:]
+    )